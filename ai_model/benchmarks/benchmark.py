@@ -0,0 +1,302 @@
+"""Benchmark del pipeline de predicción (predict.py) sobre libros sintéticos.
+
+Cada escenario (productos x meses de histórico) se ejecuta en un proceso aparte
+que mide el tiempo de cada etapa y el pico de memoria (RSS) acumulado del proceso.
+Con --memoria-etapa se mide además el pico de memoria propio de cada etapa con
+tracemalloc (solo asignaciones de Python; ralentiza la ejecución). Los resultados
+se pueden guardar como línea base y comparar en ejecuciones posteriores; un escenario
+sin referencia en la línea base (o medida en otro modo) hace fallar la comparación.
+
+Uso:
+    python benchmark.py --skus 1000 10000 --meses 14 --guardar-baseline
+    python benchmark.py --skus 1000 10000 --meses 14 --umbral 0.25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generar_libro import generar_libro
+
+try:
+    import resource
+except ImportError:  # Windows: el pico se lee con GetProcessMemoryInfo
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+MARCADOR_RESULTADO = "RESULTADO_BENCHMARK "
+
+# Diferencia mínima en segundos para considerar una regresión (evita ruido en etapas cortas)
+MIN_DIFERENCIA_SEGUNDOS = 0.05
+
+def pico_memoria_mb():
+    """Pico de memoria residente del proceso actual en MB (acumulado desde su inicio)."""
+    if resource is None:
+        return pico_memoria_windows() / (1024 * 1024)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def pico_memoria_windows():
+    """PeakWorkingSetSize del proceso actual en bytes (equivalente a ru_maxrss en Windows)."""
+    import ctypes
+    from ctypes import wintypes
+
+    class ContadoresMemoria(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t)
+        ]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    psapi = ctypes.WinDLL('psapi')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ContadoresMemoria), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+
+    contadores = ContadoresMemoria()
+    contadores.cb = ctypes.sizeof(contadores)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(contadores), contadores.cb):
+        raise ctypes.WinError()
+    return contadores.PeakWorkingSetSize
+
+def ejecutar_etapas(ruta_libro, dir_salida, con_prophet, memoria_etapa=False):
+    """Ejecuta las etapas de predict.main() midiendo cada una (modo worker)."""
+    sys.argv = [
+        'predict.py', '--excel', ruta_libro, '--output_dir', dir_salida,
+        '--previous', os.path.join(dir_salida, 'sin_anterior.json'),
+        '--log_file', os.path.join(dir_salida, 'prediction_log.txt'),
+        '--log_level', 'ERROR', '--log_max_bytes', '0'
+    ]
+    sys.path.insert(0, SRC_DIR)
+    import predict
+
+    etapas = {}
+    if memoria_etapa:
+        tracemalloc.start()
+
+    def medir(nombre, funcion, *argumentos):
+        memoria_inicial = 0
+        if memoria_etapa:
+            tracemalloc.reset_peak()
+            memoria_inicial = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        resultado = funcion(*argumentos)
+        etapas[nombre] = {
+            "segundos": round(time.perf_counter() - inicio, 4),
+            "pico_acumulado_mb": round(pico_memoria_mb(), 1)
+        }
+        if memoria_etapa:
+            # Memoria adicional que la etapa llegó a ocupar sobre la que ya estaba en uso
+            pico = tracemalloc.get_traced_memory()[1] - memoria_inicial
+            etapas[nombre]["pico_etapa_mb"] = round(pico / (1024 * 1024), 1)
+        return resultado
+
+    marco, ultima_fecha, fecha_inicio = medir("cargar_datos", predict.cargar_datos)
+
+    prophet_predictions = None
+    if con_prophet:
+        modelo = medir("cargar_modelo", predict.cargar_modelo_prophet)
+        if modelo:
+            datos = medir("preparar_prophet", predict.preparar_datos_prophet, marco)
+            prophet_predictions = medir("predecir_prophet", predict.predecir_con_prophet, modelo, datos)
+
+    _, resultados, cubo = medir(
+        "calcular_predicciones", predict.calcular_predicciones,
+        marco, ultima_fecha, fecha_inicio, 0, prophet_predictions, "familia"
+    )
+    medir("guardar_resultados", predict.guardar_resultados, resultados)
+    medir("guardar_cubo", predict.guardar_cubo_agregado, cubo)
+
+    return {
+        "productos": len(resultados),
+        "etapas": etapas,
+        "total_segundos": round(sum(e["segundos"] for e in etapas.values()), 4),
+        "pico_mb": round(pico_memoria_mb(), 1)
+    }
+
+def clave_escenario(skus, meses):
+    return f"skus={skus},meses={meses}"
+
+def obtener_libro(dir_cache, skus, meses, semilla):
+    """Devuelve la ruta del libro del escenario, generándolo solo si no está en caché."""
+    ruta = os.path.join(dir_cache, f"libro_{skus}_{meses}_{semilla}.xlsx")
+    if not os.path.exists(ruta):
+        inicio = time.perf_counter()
+        generar_libro(ruta, skus, meses, semilla=semilla)
+        print(f"  libro generado en {time.perf_counter() - inicio:.1f}s: {ruta}")
+    return ruta
+
+def ejecutar_escenario(ruta_libro, con_prophet, memoria_etapa=False):
+    """Lanza un proceso worker para el escenario y devuelve sus mediciones."""
+    with tempfile.TemporaryDirectory(prefix='kpital_bench_') as dir_salida:
+        comando = [sys.executable, os.path.abspath(__file__), '--worker', ruta_libro, '--salida', dir_salida]
+        if con_prophet:
+            comando.append('--con-prophet')
+        if memoria_etapa:
+            comando.append('--memoria-etapa')
+        proceso = subprocess.run(comando, capture_output=True, text=True)
+
+    if proceso.returncode != 0:
+        raise RuntimeError(f"El worker falló ({proceso.returncode}):\n{proceso.stdout[-2000:]}{proceso.stderr[-2000:]}")
+
+    for linea in reversed(proceso.stdout.splitlines()):
+        if linea.startswith(MARCADOR_RESULTADO):
+            return json.loads(linea[len(MARCADOR_RESULTADO):])
+    raise RuntimeError("El worker no devolvió resultados")
+
+def combinar_repeticiones(mediciones):
+    """Mejor tiempo por etapa y peor pico de memoria entre repeticiones."""
+    combinada = json.loads(json.dumps(mediciones[0]))
+    for medicion in mediciones[1:]:
+        for etapa, valores in medicion["etapas"].items():
+            actual = combinada["etapas"][etapa]
+            actual["segundos"] = min(actual["segundos"], valores["segundos"])
+            for campo in ("pico_acumulado_mb", "pico_etapa_mb"):
+                if campo in actual:
+                    actual[campo] = max(actual[campo], valores[campo])
+        combinada["pico_mb"] = max(combinada["pico_mb"], medicion["pico_mb"])
+    combinada["total_segundos"] = round(sum(e["segundos"] for e in combinada["etapas"].values()), 4)
+    return combinada
+
+def comparar_con_baseline(resultados, baseline, umbral):
+    """Devuelve las regresiones y los escenarios sin referencia comparable en la línea base."""
+    regresiones = []
+    sin_referencia = []
+    for clave, actual in resultados.items():
+        base = baseline.get(clave)
+        if base is None:
+            sin_referencia.append(f"{clave}: no está en la línea base")
+            continue
+
+        # tracemalloc añade tiempo y memoria: solo se comparan mediciones tomadas en el mismo modo
+        if actual.get("memoria_etapa", False) != base.get("memoria_etapa", False):
+            modo = "con" if base.get("memoria_etapa", False) else "sin"
+            sin_referencia.append(f"{clave}: la línea base se midió {modo} --memoria-etapa")
+            continue
+
+        tiempos = [("total", actual["total_segundos"], base["total_segundos"])]
+        tiempos += [
+            (etapa, valores["segundos"], base["etapas"][etapa]["segundos"])
+            for etapa, valores in actual["etapas"].items() if etapa in base["etapas"]
+        ]
+        for etapa, valor, referencia in tiempos:
+            if valor > referencia * (1 + umbral) and valor - referencia > MIN_DIFERENCIA_SEGUNDOS:
+                regresiones.append(f"{clave} {etapa}: {valor:.3f}s vs {referencia:.3f}s")
+
+        if actual["pico_mb"] > base["pico_mb"] * (1 + umbral):
+            regresiones.append(f"{clave} memoria: {actual['pico_mb']:.1f} MB vs {base['pico_mb']:.1f} MB")
+
+        # Memoria propia de cada etapa (solo en mediciones con --memoria-etapa)
+        for etapa, valores in actual["etapas"].items():
+            referencia = base["etapas"].get(etapa, {}).get("pico_etapa_mb")
+            if "pico_etapa_mb" in valores and referencia and valores["pico_etapa_mb"] > referencia * (1 + umbral):
+                regresiones.append(
+                    f"{clave} {etapa} memoria: {valores['pico_etapa_mb']:.1f} MB vs {referencia:.1f} MB"
+                )
+    return regresiones, sin_referencia
+
+def imprimir_resultados(resultados):
+    for clave, medicion in resultados.items():
+        print(f"{clave}: {medicion['productos']} productos, {medicion['total_segundos']:.3f}s, pico {medicion['pico_mb']:.1f} MB")
+        print(f"    {'etapa':<22} {'tiempo':>10}  {'pico acumulado':>14}  {'pico etapa':>10}")
+        for etapa, valores in medicion["etapas"].items():
+            pico_etapa = f"{valores['pico_etapa_mb']:>7.1f} MB" if "pico_etapa_mb" in valores else f"{'-':>10}"
+            print(f"    {etapa:<22} {valores['segundos']:>9.3f}s  {valores['pico_acumulado_mb']:>11.1f} MB  {pico_etapa}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline de predicción')
+    parser.add_argument('--skus', type=int, nargs='+', default=[1000, 10000],
+                        help='Número de productos por escenario (ej. 1000 10000 200000)')
+    parser.add_argument('--meses', type=int, nargs='+', default=[14],
+                        help='Meses de histórico por escenario')
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help='Repeticiones por escenario (se toma el mejor tiempo de cada etapa)')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla de los libros sintéticos')
+    parser.add_argument('--cache', type=str, default=os.path.join(tempfile.gettempdir(), 'kpital_bench_libros'),
+                        help='Directorio donde se guardan los libros generados')
+    parser.add_argument('--con-prophet', action='store_true', help='Incluir las etapas de Prophet')
+    parser.add_argument('--memoria-etapa', action='store_true',
+                        help='Medir el pico de memoria de cada etapa con tracemalloc (más lento)')
+    parser.add_argument('--baseline', type=str, default=BASELINE_PATH, help='Archivo de línea base')
+    parser.add_argument('--guardar-baseline', action='store_true', help='Guardar los resultados como línea base')
+    parser.add_argument('--umbral', type=float, default=0.25,
+                        help='Aumento relativo permitido antes de marcar una regresión (0.25 = 25%%)')
+    parser.add_argument('--salida-json', type=str, help='Guardar los resultados en este archivo')
+    parser.add_argument('--worker', type=str, help=argparse.SUPPRESS)
+    parser.add_argument('--salida', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        resultado = ejecutar_etapas(args.worker, args.salida, args.con_prophet, args.memoria_etapa)
+        print(MARCADOR_RESULTADO + json.dumps(resultado), flush=True)
+        return 0
+
+    os.makedirs(args.cache, exist_ok=True)
+    resultados = {}
+    for meses in args.meses:
+        for skus in args.skus:
+            clave = clave_escenario(skus, meses)
+            print(f"Escenario {clave}")
+            ruta_libro = obtener_libro(args.cache, skus, meses, args.semilla)
+            mediciones = [
+                ejecutar_escenario(ruta_libro, args.con_prophet, args.memoria_etapa)
+                for _ in range(args.repeticiones)
+            ]
+            resultados[clave] = combinar_repeticiones(mediciones)
+            resultados[clave]["memoria_etapa"] = args.memoria_etapa
+
+    imprimir_resultados(resultados)
+
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.guardar_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(resultados)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    regresiones, sin_referencia = comparar_con_baseline(resultados, baseline, args.umbral)
+    if sin_referencia:
+        # Un escenario sin referencia no se ha comprobado: no se da por bueno
+        print("Escenarios sin línea base comparable (use --guardar-baseline para registrarlos):")
+        for escenario in sin_referencia:
+            print(f"  - {escenario}")
+    if regresiones:
+        print(f"Regresiones detectadas (umbral {args.umbral:.0%}):")
+        for regresion in regresiones:
+            print(f"  - {regresion}")
+    if regresiones or sin_referencia:
+        return 1
+
+    print(f"Sin regresiones respecto a la línea base (umbral {args.umbral:.0%})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
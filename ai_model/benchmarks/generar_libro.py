@@ -0,0 +1,121 @@
+"""Generador de libros Excel sintéticos con el formato que espera predict.py.
+
+Reproduce la estructura del libro real: fila 1 vacía, fecha de corte en A2,
+encabezados en la fila 3 (con saltos de línea como en el original), columnas
+"CONS <MES>\\n<AÑO>" para el histórico y columnas de POs.
+
+Uso:
+    python generar_libro.py --skus 10000 --meses 14 --salida libro.xlsx
+"""
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+from matplotlib.dates import relativedelta
+from openpyxl import Workbook
+
+SPANISH_MONTHS = {
+    1: "ENE", 2: "FEB", 3: "MAR", 4: "ABR",
+    5: "MAY", 6: "JUN", 7: "JUL", 8: "AGO",
+    9: "SEP", 10: "OCT", 11: "NOV", 12: "DIC"
+}
+
+DESCRIPCIONES = [
+    "SOLVENTE DE CODIFICACION", "TINTA VJ 1000 NEGRA", "TINTA EXCEL AZUL CLARO",
+    "MAKE-UP VJ1000-CONTROLADO", "SOLUCION DE LIMPIEZA", "MEK METIL ETIL CETONA (MEK TINTA)",
+    "TINTA VJ 1000-UHS NEGRA", "TINTA UNICORNIO NEGRA", "MAKE-UP EXCEL", "TINTA WILLET NEGRA"
+]
+
+# Columnas posteriores al histórico, tal como aparecen en el libro real
+COLUMNAS_PEDIDOS = [
+    "PROM CONS+Proyec", "PROM CONSU", "Proyec de \nConss", "Prom 8 meses", "DIARIO",
+    "CONSUMO  PROYECTADO HASTA ANTES DEL ARRIBO DEL  PROX PO",
+    "STOCK HASTA ANTES DEL ARRIBO DEL PROXIMO PO ",
+    "A PEDIR\nUNID\nPO-2573\nAIR", "STOCK INCLUYENDO PO-2571",
+    "CONSUMO  PROYECTADO HASTA ANTES DEL ARRIBO DEL  PROX PO",
+    "STOCK HASTA ANTES DEL ARRIBO DEL PROXIMO PO ",
+    "A PEDIR\nUNID\nPO-V2565", "STOCK INCLUYENDO PO2504",
+    "SS ", "STOCK MINIMO (Prom + SS)", "cajas", "redondeo cajas",
+    "A PEDIR\nUNID\nPO-V2580", "A PEDIR\nUNID&CAJAS\nPO-V2580"
+]
+
+def columnas_consumo(fecha_corte, n_meses):
+    """Encabezados "CONS <MES>\\n<AÑO>" de los n_meses que terminan en el mes de corte."""
+    columnas = []
+    for i in range(n_meses - 1, -1, -1):
+        fecha = fecha_corte - relativedelta(months=i)
+        columnas.append(f"CONS {SPANISH_MONTHS[fecha.month]}\n{fecha.year}")
+    return columnas
+
+def generar_codigos(n_skus, rng):
+    """Genera códigos únicos con familias repetidas (ej. "V7201-D", "16-3601Q")."""
+    familias = [f"V{n}" for n in rng.integers(400, 8000, size=max(n_skus // 3, 1))] + ["16", "201", "M512"]
+    sufijos = ["D", "Q", "C", "R"]
+    codigos = []
+    for i in range(n_skus):
+        familia = familias[i % len(familias)]
+        codigos.append(f"{familia}-{i:06d}{sufijos[i % len(sufijos)]}")
+    return codigos
+
+def generar_libro(ruta, n_skus, n_meses=14, fecha_corte=datetime(2025, 2, 14), semilla=42):
+    """Escribe un libro sintético de n_skus productos y n_meses de histórico en ruta."""
+    rng = np.random.default_rng(semilla)
+    cols_consumo = columnas_consumo(fecha_corte, n_meses)
+
+    # Consumos enteros con nivel propio por producto, estacionalidad y meses sin consumo
+    nivel = rng.lognormal(mean=4.0, sigma=1.2, size=(n_skus, 1))
+    estacionalidad = 1 + 0.2 * np.sin(np.arange(n_meses) * 2 * np.pi / 12)
+    consumo = np.rint(rng.poisson(nivel * estacionalidad)).astype(np.int64)
+    consumo[rng.random((n_skus, n_meses)) < 0.05] = 0
+
+    unid_caja = rng.choice([1, 6, 9, 12], size=n_skus)
+    stock = np.rint(consumo.mean(axis=1) * rng.uniform(0.2, 3.0, size=n_skus)).astype(np.int64)
+    proyeccion = np.where(rng.random(n_skus) < 0.2, rng.integers(1, 60, size=n_skus), 0)
+    codigos = generar_codigos(n_skus, rng)
+    descripciones = rng.choice(DESCRIPCIONES, size=n_skus)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("19feb V2580")
+
+    encabezados = ["CODIGO", "DESCRIPCION", "UNID/CAJA", None, "STOCK  TOTAL"] + cols_consumo + COLUMNAS_PEDIDOS
+    ws.append([None] * len(encabezados))
+    ws.append([fecha_corte] + [None] * (len(encabezados) - 1))
+    ws.append(encabezados)
+
+    for i in range(n_skus):
+        prom = float(consumo[i].mean())
+        diario = (prom + proyeccion[i]) / 22
+        fila = [codigos[i], str(descripciones[i]), int(unid_caja[i]), 1, int(stock[i])]
+        fila += consumo[i].tolist()
+        fila += [prom + proyeccion[i], prom, int(proyeccion[i]), prom, diario]
+        fila += [round(diario * 5, 2), round(stock[i] - diario * 5, 2), None,
+                 round(stock[i] - diario * 5, 2), round(diario * 20, 2),
+                 round(stock[i] - diario * 25, 2), int(unid_caja[i] * 10), 0,
+                 round(diario * 19, 2), round(prom + diario * 19, 2), 0, 0,
+                 int(unid_caja[i] * 12), int(unid_caja[i] * 12)]
+        ws.append(fila)
+
+    # Filas de totales al final del libro (CODIGO numérico, se descartan al cargar)
+    for total in (0, 6, 0):
+        ws.append([total] + [None] * (len(encabezados) - 1))
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    wb.save(ruta)
+    return ruta
+
+def main():
+    parser = argparse.ArgumentParser(description='Generar un libro Excel sintético de inventario')
+    parser.add_argument('--skus', type=int, default=1000, help='Número de productos')
+    parser.add_argument('--meses', type=int, default=14, help='Meses de histórico de consumo')
+    parser.add_argument('--fecha', type=str, default='2025-02-14', help='Fecha de corte (celda A2)')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria')
+    parser.add_argument('--salida', type=str, required=True, help='Ruta del libro a generar')
+    args = parser.parse_args()
+
+    fecha = datetime.strptime(args.fecha, '%Y-%m-%d')
+    generar_libro(args.salida, args.skus, args.meses, fecha, args.semilla)
+    print(f"Libro generado: {args.salida} ({args.skus} productos, {args.meses} meses)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Delta entre dos ejecuciones de predicciones (altas, bajas y campos modificados por producto).
+
+Lo usan predict.py, al guardar cada ejecución, y el backend, al publicar el resultado de un
+trabajo contra las predicciones vigentes en ese momento.
+
+Uso:
+    python delta.py --anterior ../data/predicciones_completas.min.json \
+        --actual salida/predicciones_completas.min.json --salida salida/predicciones_delta.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+def normalizar_numeros(valor):
+    """Convierte todos los números a float para comparar productos sin depender del formato.
+
+    El backend reescribe las predicciones con JSON.stringify, que guarda 1.0 como 1.
+    """
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, dict):
+        return {k: normalizar_numeros(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [normalizar_numeros(v) for v in valor]
+    return valor
+
+def hash_contenido(valor):
+    """Hash estable de un valor JSON (claves ordenadas y números normalizados a float)."""
+    contenido = json.dumps(normalizar_numeros(valor), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+def hash_producto(producto):
+    """Hash estable del contenido de un producto."""
+    return hash_contenido(producto)
+
+def calcular_delta(resultados_nuevos, resultados_anteriores):
+    """Compara dos ejecuciones por hash de producto y devuelve altas, bajas y campos modificados."""
+    anteriores = {p["CODIGO"]: p for p in resultados_anteriores}
+    hashes = {}
+    agregados = []
+    modificados = {}
+
+    for producto in resultados_nuevos:
+        codigo = producto["CODIGO"]
+        hashes[codigo] = hash_producto(producto)
+        anterior = anteriores.get(codigo)
+
+        if anterior is None:
+            agregados.append(producto)
+        elif hash_producto(anterior) != hashes[codigo]:
+            # Solo los campos de primer nivel que cambiaron
+            campos = {
+                campo: valor for campo, valor in producto.items()
+                if anterior.get(campo) != valor
+            }
+            if campos:
+                modificados[codigo] = campos
+
+    eliminados = sorted(set(anteriores) - set(hashes))
+
+    return {
+        "TOTAL_PRODUCTOS": len(resultados_nuevos),
+        "SIN_CAMBIOS": len(resultados_nuevos) - len(agregados) - len(modificados),
+        "AGREGADOS": agregados,
+        "ELIMINADOS": eliminados,
+        "MODIFICADOS": modificados,
+        "HASHES": hashes
+    }
+
+def escribir_delta(delta, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Calcular el delta entre dos archivos de predicciones')
+    parser.add_argument('--anterior', type=str, default=None,
+                        help='Predicciones de referencia (si no existe, todos los productos son altas)')
+    parser.add_argument('--actual', type=str, required=True,
+                        help='Predicciones nuevas')
+    parser.add_argument('--salida', type=str, required=True,
+                        help='Archivo donde se escribe el delta')
+    args = parser.parse_args()
+
+    try:
+        anteriores = []
+        if args.anterior and os.path.exists(args.anterior):
+            with open(args.anterior, 'r', encoding='utf-8') as f:
+                anteriores = json.load(f)
+        with open(args.actual, 'r', encoding='utf-8') as f:
+            actuales = json.load(f)
+
+        escribir_delta(calcular_delta(actuales, anteriores), args.salida)
+    except Exception as e:
+        print(f"Error calculando delta: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
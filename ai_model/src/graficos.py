@@ -0,0 +1,221 @@
+"""Generación de gráficos de histórico y proyección por producto.
+
+Se ejecuta en segundo plano después de guardar las predicciones. Cada gráfico
+se guarda con el hash de los datos que representa, de modo que solo se vuelven
+a renderizar los productos cuyo histórico o proyección cambió.
+
+Uso:
+    python graficos.py --predicciones ../data/predicciones_completas.min.json
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import matplotlib
+matplotlib.use('Agg')  # Backend sin interfaz gráfica, seguro en procesos hijos
+import matplotlib.pyplot as plt
+
+from delta import hash_contenido
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+GRAFICOS_DIR = os.path.join(DATA_DIR, 'graficos')
+INDICE_GRAFICOS = 'indice_graficos.json'
+BLOQUEO_GRAFICOS = '.graficos.lock'
+
+logger = logging.getLogger(__name__)
+
+def nombre_archivo(codigo, hash_datos):
+    """Nombre del PNG de un producto; incluye el hash para no pisar versiones en uso."""
+    codigo_seguro = re.sub(r'[^A-Za-z0-9_-]', '_', str(codigo))
+    return f"{codigo_seguro}_{hash_datos[:12]}.png"
+
+def datos_grafico(producto):
+    """Extrae del producto solo los datos que se dibujan."""
+    return {
+        "CODIGO": producto["CODIGO"],
+        "DESCRIPCION": producto.get("DESCRIPCION", ""),
+        "PUNTO_REORDEN": producto.get("PUNTO_REORDEN", 0),
+        "HISTORICO": producto.get("HISTORICO_CONSUMOS", {}),
+        "PROYECCION": [
+            [p["mes"], p["consumo_mensual"], p["stock_proyectado"]]
+            for p in producto.get("PROYECCIONES", [])
+        ]
+    }
+
+def hash_datos_grafico(datos):
+    # Mismo hash que el delta: 674.0 (predict.py) y 674 (JSON.stringify) dan el mismo gráfico
+    return hash_contenido(datos)
+
+def renderizar_grafico(tarea):
+    """Dibuja el gráfico de un producto (se ejecuta en un proceso del pool)."""
+    datos, ruta = tarea
+    try:
+        historico = list(datos["HISTORICO"].items())
+        proyeccion = datos["PROYECCION"]
+
+        etiquetas = [mes.replace("_", "-") for mes, _ in historico] + [p[0] for p in proyeccion]
+        x_hist = list(range(len(historico)))
+        x_proy = list(range(len(historico), len(etiquetas)))
+
+        fig, ax = plt.subplots(figsize=(8, 3.5))
+        ax.plot(x_hist, [valor for _, valor in historico], marker='o', label='Consumo histórico')
+        if proyeccion:
+            # La proyección arranca desde el último punto histórico para que la línea sea continua
+            x_linea = x_hist[-1:] + x_proy
+            y_linea = [historico[-1][1]] * bool(historico) + [p[1] for p in proyeccion]
+            ax.plot(x_linea, y_linea, marker='o', linestyle='--', label='Consumo proyectado')
+            ax.bar(x_proy, [p[2] for p in proyeccion], alpha=0.3, label='Stock proyectado')
+        ax.axhline(datos["PUNTO_REORDEN"], color='red', linewidth=1, linestyle=':', label='Punto de reorden')
+
+        ax.set_xticks(range(len(etiquetas)))
+        ax.set_xticklabels(etiquetas, rotation=45, ha='right', fontsize=7)
+        ax.set_title(f"{datos['CODIGO']} - {datos['DESCRIPCION']}", fontsize=9)
+        ax.set_ylabel('Unidades')
+        ax.legend(fontsize=7, loc='upper left')
+        fig.tight_layout()
+
+        ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+        fig.savefig(ruta_tmp, dpi=80, format='png')
+        plt.close(fig)
+        os.replace(ruta_tmp, ruta)
+        return datos["CODIGO"], None
+
+    except Exception as e:
+        plt.close('all')
+        return datos["CODIGO"], str(e)
+
+def cargar_indice(dir_graficos):
+    ruta = os.path.join(dir_graficos, INDICE_GRAFICOS)
+    if not os.path.exists(ruta):
+        return {}
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Índice de gráficos ilegible, se regenerarán todos: {str(e)}")
+        return {}
+
+def guardar_indice(dir_graficos, indice):
+    ruta = os.path.join(dir_graficos, INDICE_GRAFICOS)
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(ruta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(indice, f, ensure_ascii=False)
+    os.replace(ruta_tmp, ruta)
+
+@contextmanager
+def bloqueo_exclusivo(ruta):
+    """Bloqueo entre procesos sobre un archivo; el sistema lo libera si el proceso muere."""
+    with open(ruta, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK desiste tras ~10 s; se sigue esperando
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def generar_graficos(ruta_predicciones, dir_graficos=GRAFICOS_DIR, procesos=None):
+    """Renderiza en paralelo los gráficos de los productos cuyos datos cambiaron.
+
+    Las ejecuciones sobre un mismo directorio se serializan: cada una lee el índice y las
+    predicciones dentro del bloqueo, así que la última en entrar parte del estado que dejó
+    la anterior y no borra gráficos que otro índice aún referencia.
+    """
+    os.makedirs(dir_graficos, exist_ok=True)
+
+    with bloqueo_exclusivo(os.path.join(dir_graficos, BLOQUEO_GRAFICOS)):
+        return _generar_graficos(ruta_predicciones, dir_graficos, procesos)
+
+def _generar_graficos(ruta_predicciones, dir_graficos, procesos):
+    with open(ruta_predicciones, 'r', encoding='utf-8') as f:
+        predicciones = json.load(f)
+
+    indice_anterior = cargar_indice(dir_graficos)
+    indice = {}
+    tareas = []
+
+    for producto in predicciones:
+        datos = datos_grafico(producto)
+        hash_datos = hash_datos_grafico(datos)
+        archivo = nombre_archivo(datos["CODIGO"], hash_datos)
+        indice[datos["CODIGO"]] = {"hash": hash_datos, "archivo": archivo}
+
+        anterior = indice_anterior.get(datos["CODIGO"])
+        if anterior and anterior["hash"] == hash_datos and os.path.exists(os.path.join(dir_graficos, archivo)):
+            continue
+        tareas.append((datos, os.path.join(dir_graficos, archivo)))
+
+    logger.info(f"Gráficos: {len(tareas)} por renderizar, {len(indice) - len(tareas)} en caché")
+
+    errores = 0
+    if tareas:
+        procesos = procesos or max((os.cpu_count() or 2) - 1, 1)
+        chunksize = max(len(tareas) // (procesos * 4), 1)
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for codigo, error in pool.map(renderizar_grafico, tareas, chunksize=chunksize):
+                if error:
+                    errores += 1
+                    indice.pop(codigo, None)
+                    logger.error(f"Error al renderizar gráfico de {codigo}: {error}")
+
+    guardar_indice(dir_graficos, indice)
+
+    # Eliminar gráficos de versiones anteriores o de productos que ya no existen
+    vigentes = {entrada["archivo"] for entrada in indice.values()}
+    for entrada in indice_anterior.values():
+        if entrada["archivo"] not in vigentes:
+            try:
+                os.remove(os.path.join(dir_graficos, entrada["archivo"]))
+            except FileNotFoundError:
+                pass
+
+    logger.info(f"Gráficos generados: {len(tareas) - errores}, errores: {errores}")
+    return indice
+
+def main():
+    parser = argparse.ArgumentParser(description='Generar gráficos de histórico y proyección por producto')
+    parser.add_argument('--predicciones', type=str,
+                        default=os.path.join(DATA_DIR, 'predicciones_completas.min.json'),
+                        help='Archivo de predicciones a graficar')
+    parser.add_argument('--dir_graficos', type=str, default=GRAFICOS_DIR,
+                        help='Directorio de salida de los gráficos')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='Procesos de renderizado (por defecto, núcleos - 1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(BASE_DIR, 'graficos_log.txt'), encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    try:
+        generar_graficos(args.predicciones, args.dir_graficos, args.procesos)
+    except Exception as e:
+        logger.error(f"Error generando gráficos: {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
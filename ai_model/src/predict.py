@@ -3,16 +3,24 @@ import re
 import sys
 import os
 import argparse
+import subprocess
 from matplotlib.dates import relativedelta
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import locale
 import logging
+import logging.handlers
+import queue
+import atexit
+import copy
 import gzip
 import pickle
+from dataclasses import dataclass, field
 from sklearn.metrics import mean_absolute_percentage_error
 
+from delta import calcular_delta, escribir_delta
+
 # Configuración regional
 try:
     locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
@@ -37,8 +45,38 @@ parser.add_argument('--transito', type=float, default=0.0,
                    help='Unidades en tránsito disponibles para asignación')
 parser.add_argument('--dias_transito', type=int, default=0,
                    help='Días de tránsito para los pedidos (laborables)')
+parser.add_argument('--agrupacion_cubo', type=str, default='familia',
+                   choices=['familia', 'prefijo', 'ninguna'],
+                   help='Agrupación de productos en el cubo agregado')
+parser.add_argument('--output_dir', type=str, default=None,
+                   help='Directorio de salida de los resultados (por defecto, el directorio de datos)')
+parser.add_argument('--previous', type=str,
+                   default=os.path.join(DATA_DIR, 'predicciones_completas.min.json'),
+                   help='Predicciones de la ejecución anterior para calcular el delta')
+parser.add_argument('--sin_delta', action='store_true',
+                   help='No calcular el delta (el backend lo calcula al publicar el resultado)')
+parser.add_argument('--sin_graficos', action='store_true',
+                   help='No lanzar la generación de gráficos por producto al terminar')
+parser.add_argument('--log_level', type=str, default='INFO',
+                   choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                   help='Nivel de logging de la ejecución')
+parser.add_argument('--log_file', type=str,
+                   default=os.path.join(BASE_DIR, 'prediction_log.txt'),
+                   help='Archivo de log de la ejecución')
+parser.add_argument('--log_formato', type=str, default='json', choices=['json', 'texto'],
+                   help='Formato de los registros de log')
+parser.add_argument('--log_max_bytes', type=int, default=5 * 1024 * 1024,
+                   help='Tamaño máximo del archivo de log antes de rotarlo (0 desactiva la rotación)')
+parser.add_argument('--log_backups', type=int, default=3,
+                   help='Número de archivos de log rotados que se conservan')
+parser.add_argument('--log_max_avisos_evento', type=int, default=5,
+                   help='Avisos de cada tipo de evento (sumando todos los productos) que se registran antes de resumirlos')
 args = parser.parse_args()
 
+# Directorio de salida propio por ejecución para que trabajos concurrentes no se sobrescriban
+OUTPUT_DIR = os.path.abspath(args.output_dir) if args.output_dir else DATA_DIR
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
 # Diccionario de meses en español
 SPANISH_MONTHS = {
     1: "ENE", 2: "FEB", 3: "MAR", 4: "ABR", 
@@ -46,18 +84,163 @@ SPANISH_MONTHS = {
     9: "SEP", 10: "OCT", 11: "NOV", 12: "DIC"
 }
 
-def setup_logging():
-    """Configura el sistema de logging"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(os.path.join(BASE_DIR, 'prediction_log.txt'), encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
+# Esquema de columnas que se cargan del Excel (además de las columnas "CONS <MES> <AÑO>")
+COLUMNAS_TEXTO = ["CODIGO", "DESCRIPCION"]
+COLUMNAS_NUMERICAS = ["UNID/CAJA", "STOCK  TOTAL", "Proyec de  Conss"]
+COLUMNAS_ESQUEMA = COLUMNAS_TEXTO + COLUMNAS_NUMERICAS
+
+# Cadenas respaldadas por Arrow si pyarrow está disponible. Sin pyarrow, CODIGO (único por
+# producto) se queda como object y solo DESCRIPCION, que se repite, pasa a categórica
+try:
+    import pyarrow  # noqa: F401
+    TIPO_CODIGO = pd.StringDtype("pyarrow")
+    TIPO_DESCRIPCION = pd.StringDtype("pyarrow")
+except ImportError:
+    TIPO_CODIGO = object
+    TIPO_DESCRIPCION = "category"
+
+@dataclass
+class MarcoProductos:
+    """Productos con tipos compactos y una matriz de consumo contigua (SKU x mes)."""
+    productos: pd.DataFrame
+    consumo: np.ndarray
+    cols_consumo: list
+    fechas_consumo: list
+    derivados: pd.DataFrame = field(default=None)
+
+    def __len__(self):
+        return len(self.productos)
+
+    def memoria_bytes(self):
+        """Memoria ocupada por el marco, incluyendo cadenas."""
+        total = int(self.productos.memory_usage(deep=True).sum()) + self.consumo.nbytes
+        if self.derivados is not None:
+            total += int(self.derivados.memory_usage(deep=True).sum())
+        return total
+
+# Métricas mensuales del cubo agregado del catálogo
+CUBO_METRICAS = [
+    "productos", "consumo_mensual", "cajas_a_pedir",
+    "unidades_a_pedir", "productos_en_alerta", "stock_proyectado"
+]
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record):
+        registro = {
+            "fecha": self.formatTime(record),
+            "nivel": record.levelname,
+            "mensaje": record.getMessage()
+        }
+        for campo in ("sku", "evento"):
+            if hasattr(record, campo):
+                registro[campo] = getattr(record, campo)
+        if record.exc_info:
+            registro["excepcion"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            registro["excepcion"] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False)
+
+class ColaLogsEstructurada(logging.handlers.QueueHandler):
+    """QueueHandler que no mezcla la traza de una excepción con el mensaje.
+
+    El ``prepare`` estándar formatea el registro completo (mensaje y traza) en ``msg`` y borra
+    ``exc_info``; aquí la traza viaja aparte en ``exc_text`` para que el formateador del
+    listener la escriba en su propio campo.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+class AgregadorAvisosSKU(logging.Filter):
+    """Limita los avisos por producto repetidos y los acumula para un resumen final.
+
+    Aplica a los registros con los atributos ``sku`` y ``evento`` (pasados con ``extra``):
+    de cada tipo de evento solo se emiten los primeros ``limite`` avisos, sumando todos los
+    productos; el resto se cuenta. El resumen distingue avisos de productos afectados, ya que
+    un mismo producto puede emitir varios avisos del mismo evento (uno por mes proyectado).
+    """
+
+    def __init__(self, limite):
+        super().__init__()
+        self.limite = limite
+        self.avisos = {}
+        self.suprimidos = {}
+        self.productos = {}
+
+    def filter(self, record):
+        evento = getattr(record, "evento", None)
+        if evento is None or not hasattr(record, "sku"):
+            return True
+
+        self.avisos[evento] = self.avisos.get(evento, 0) + 1
+        self.productos.setdefault(evento, {})[record.sku] = None  # dict: conjunto con orden de llegada
+
+        if self.avisos[evento] <= self.limite:
+            return True
+        self.suprimidos[evento] = self.suprimidos.get(evento, 0) + 1
+        return False
+
+    def resumen(self):
+        """Devuelve (evento, avisos, productos afectados, suprimidos, ejemplos) por evento."""
+        return [
+            (evento, avisos, len(self.productos[evento]), self.suprimidos.get(evento, 0),
+             list(self.productos[evento])[:5])
+            for evento, avisos in self.avisos.items()
         ]
-    )
-    return logging.getLogger()
 
+def setup_logging():
+    """Configura el sistema de logging asíncrono (cola + hilo escritor)"""
+    formateador = FormateadorJSON() if args.log_formato == 'json' else \
+        logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    log_path = args.log_file
+    if args.log_max_bytes > 0:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=args.log_max_bytes, backupCount=args.log_backups, encoding='utf-8'
+        )
+    else:
+        file_handler = logging.FileHandler(log_path, encoding='utf-8')
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formateador)
+
+    # La E/S se hace en el hilo del QueueListener para no bloquear el cálculo
+    cola_logs = queue.SimpleQueue()
+    queue_handler = ColaLogsEstructurada(cola_logs)
+    queue_handler.addFilter(agregador_avisos)
+    listener = logging.handlers.QueueListener(cola_logs, file_handler, stream_handler)
+
+    root = logging.getLogger()
+    root.setLevel(args.log_level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener.start()
+    atexit.register(cerrar_logging, listener)
+    return root
+
+def cerrar_logging(listener):
+    """Registra el resumen de avisos por producto y vacía la cola de logs."""
+    for evento, avisos, productos, suprimidos, ejemplos in agregador_avisos.resumen():
+        if suprimidos:
+            logging.getLogger().warning(
+                f"Resumen '{evento}': {productos} productos afectados, {avisos} avisos "
+                f"({suprimidos} agrupados; ejemplos: {', '.join(map(str, ejemplos))})",
+                extra={"evento": f"{evento}_resumen"}
+            )
+    listener.stop()
+
+agregador_avisos = AgregadorAvisosSKU(args.log_max_avisos_evento)
 logger = setup_logging()
 
 def parsear_fecha_excel(fecha_celda):
@@ -110,6 +293,22 @@ def parsear_fecha_excel(fecha_celda):
         logger.error(f"Error al parsear fecha: {str(e)}")
         return None
 
+def limpiar_nombre_columna(col):
+    """Normaliza el nombre de una columna del Excel."""
+    return str(col).strip().replace("\n", " ")
+
+def fecha_columna_consumo(col):
+    """Devuelve (año, mes) de una columna "CONS <MES> <AÑO>", o None si no se reconoce."""
+    partes = col.split()
+    if len(partes) < 3:
+        return None
+    
+    año = int(partes[2])
+    for num, abr in SPANISH_MONTHS.items():
+        if abr.upper() == partes[1].upper():
+            return año, num
+    return None
+
 def identificar_columnas_consumo(df):
     """Identifica dinámicamente todas las columnas de consumo disponibles en el DataFrame."""
     cols_consumo = [col for col in df.columns if col.startswith("CONS ")]
@@ -123,23 +322,13 @@ def identificar_columnas_consumo(df):
     fechas_consumo = []
     for col in cols_consumo:
         try:
-            partes = col.split()
-            if len(partes) >= 3:
-                mes_abr = partes[1]
-                año = int(partes[2])
-                
-                mes_num = None
-                for num, abr in SPANISH_MONTHS.items():
-                    if abr.upper() == mes_abr.upper():
-                        mes_num = num
-                        break
-                
-                if mes_num:
-                    fecha = datetime(año, mes_num, 1)
-                    fechas_consumo.append((col, fecha))
-                    logger.debug(f"Columna {col} mapeada a {fecha}")
-                else:
-                    logger.warning(f"No se pudo identificar el mes para columna: {col}")
+            año_mes = fecha_columna_consumo(col)
+            if año_mes:
+                fecha = datetime(año_mes[0], año_mes[1], 1)
+                fechas_consumo.append((col, fecha))
+                logger.debug(f"Columna {col} mapeada a {fecha}")
+            elif len(col.split()) >= 3:
+                logger.warning(f"No se pudo identificar el mes para columna: {col}")
         except Exception as e:
             logger.warning(f"Error al procesar columna {col}: {str(e)}")
     
@@ -182,9 +371,57 @@ def identificar_columnas_pedidos(df):
                 cols_pedidos[po_num][tipo] = col
                 logger.debug(f"Columna {col} identificada como {tipo} para PO {po_num}")
     
-    logger.info(f"Columnas de pedidos identificadas: {json.dumps(cols_pedidos, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Columnas de pedidos identificadas: {json.dumps(cols_pedidos)}")
+    logger.info(f"Columnas de pedidos identificadas: {len(cols_pedidos)} POs")
     return cols_pedidos
 
+def es_float32_exacto(valores):
+    """Indica si un arreglo float64 se puede almacenar en float32 sin pérdida."""
+    return bool(np.array_equal(valores.astype(np.float32).astype(np.float64), valores))
+
+def tipo_compacto(valores):
+    """Devuelve float32 cuando la precisión lo permite y float64 en caso contrario."""
+    return np.float32 if es_float32_exacto(valores) else np.float64
+
+def columna_numerica(df, col):
+    """Convierte una columna a float64 tratando valores inválidos o ausentes como 0."""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=np.float64)
+    return pd.to_numeric(df[col], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+def construir_marco_productos(df, cols_consumo):
+    """Construye el marco tipado de productos a partir del DataFrame leído del Excel."""
+    # Solo las filas con un CODIGO de texto son productos (el resto son totales o filas vacías)
+    codigos = df["CODIGO"]
+    es_producto = codigos.map(lambda c: isinstance(c, str) and c != "Sin información").to_numpy(dtype=bool)
+    df = df.loc[es_producto]
+
+    columnas = {
+        "CODIGO": df["CODIGO"].astype(TIPO_CODIGO),
+        "DESCRIPCION": df["DESCRIPCION"].fillna("Sin información").astype(str).astype(TIPO_DESCRIPCION)
+    }
+    for col in COLUMNAS_NUMERICAS:
+        valores = columna_numerica(df, col)
+        if col == "UNID/CAJA":
+            valores[valores == 0] = 1
+        columnas[col] = valores.astype(tipo_compacto(valores))
+
+    productos = pd.DataFrame(columnas).reset_index(drop=True)
+
+    # Matriz contigua (SKU x mes) en lugar de una columna por mes
+    consumo = np.column_stack([columna_numerica(df, col) for col in cols_consumo]) if len(df) else np.zeros((0, len(cols_consumo)))
+    consumo = np.ascontiguousarray(consumo, dtype=tipo_compacto(consumo))
+
+    fechas_consumo = [fecha_columna_consumo(col) for col in cols_consumo]
+
+    marco = MarcoProductos(productos, consumo, cols_consumo, fechas_consumo)
+    logger.info(
+        f"Marco de productos: {len(marco)} productos x {len(cols_consumo)} meses, "
+        f"consumo {consumo.dtype}, {marco.memoria_bytes() / 1024:.1f} KiB"
+    )
+    return marco
+
 def cargar_datos():
     """Carga y valida el archivo Excel."""
     try:
@@ -207,19 +444,17 @@ def cargar_datos():
         else:
             logger.info(f"Fecha parseada de A2: {fecha_inicio_prediccion}")
         
-        # Resto del código para cargar el dataframe...
-        df_raw = pd.read_excel(args.excel)
-        logger.info(f"Primeras filas del Excel (sin procesar):\n{df_raw.head(2)}")
-        
-        df = pd.read_excel(args.excel, skiprows=2)
+        # Solo se leen las columnas del esquema y las de consumo
+        df = pd.read_excel(
+            args.excel,
+            skiprows=2,
+            usecols=lambda col: limpiar_nombre_columna(col) in COLUMNAS_ESQUEMA or limpiar_nombre_columna(col).startswith("CONS ")
+        )
         logger.info("Archivo leído correctamente")
         
         # Limpieza de columnas
-        df.columns = [col.strip().replace("\n", " ") for col in df.columns]
-        
-        cols_to_drop = [col for col in df.columns if "Unnamed" in col]
-        if cols_to_drop:
-            df = df.drop(columns=cols_to_drop)
+        df.columns = [limpiar_nombre_columna(col) for col in df.columns]
+        logger.info(f"Primeras filas del Excel:\n{df.head(2)}")
         
         # Identificar columnas de consumo dinámicamente
         cols_consumo, ultima_fecha = identificar_columnas_consumo(df)
@@ -231,12 +466,11 @@ def cargar_datos():
             raise ValueError(f"Columnas básicas faltantes: {missing_cols}")
         
         # Rellenar valores nulos
-        text_columns = ["CODIGO", "DESCRIPCION"]
-        for col in text_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna("Sin información")
+        df["CODIGO"] = df["CODIGO"].fillna("Sin información")
+
+        marco = construir_marco_productos(df, cols_consumo)
     
-        return df, cols_consumo, ultima_fecha, fecha_inicio_prediccion
+        return marco, ultima_fecha, fecha_inicio_prediccion
 
     except Exception as e:
         logger.error(f"Error en carga de datos: {str(e)}")
@@ -263,43 +497,21 @@ def cargar_modelo_prophet():
         logger.warning("Continuando sin modelo Prophet, usando método estadístico alternativo")
         return None
 
-def preparar_datos_prophet(df, cols_consumo):
+def preparar_datos_prophet(marco):
     """Prepara los datos para su uso con Prophet."""
     prophet_data = {}
     
-    for _, row in df.iterrows():
-        if not isinstance(row["CODIGO"], str) or row["CODIGO"] == "Sin información":
-            continue
-            
-        # Crear serie temporal con datos históricos
-        dates = []
-        values = []
-        
-        # Procesar todas las columnas de consumo identificadas
-        for col in cols_consumo:
-            partes = col.split()
-            if len(partes) >= 3:
-                mes_abr = partes[1]
-                año = int(partes[2])
-                
-                # Convertir abreviatura de mes a número
-                for num, abr in SPANISH_MONTHS.items():
-                    if abr == mes_abr:
-                        mes_num = num
-                        break
-                else:
-                    continue
-                
-                dates.append(pd.Timestamp(año, mes_num, 15))
-                values.append(row.get(col, 0))
-                
-        # Crear DataFrame para Prophet
-        if dates and values:
-            ts_df = pd.DataFrame({
-                'ds': dates,
-                'y': values
-            })
-            prophet_data[row["CODIGO"]] = ts_df
+    if not marco.cols_consumo:
+        return prophet_data
+    
+    # Serie temporal con datos históricos (día 15 de cada mes)
+    dates = [pd.Timestamp(año, mes, 15) for año, mes in marco.fechas_consumo]
+    
+    for codigo, valores in zip(marco.productos["CODIGO"].tolist(), marco.consumo):
+        prophet_data[codigo] = pd.DataFrame({
+            'ds': dates,
+            'y': valores.astype(np.float64)
+        })
     
     return prophet_data
 
@@ -336,13 +548,19 @@ def predecir_con_prophet(prophet_model, prophet_data):
                 
                 # Verificar si el error es menor al 5%
                 if mape > 0.05:
-                    logger.warning(f"Error MAPE para {codigo} es {mape:.2%}, superior al 5% permitido")
+                    logger.warning(
+                        f"Error MAPE para {codigo} es {mape:.2%}, superior al 5% permitido",
+                        extra={"sku": codigo, "evento": "mape_alto"}
+                    )
             
             # Guardar resultados
             resultados[codigo] = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].to_dict('records')
             
         except Exception as e:
-            logger.error(f"Error al predecir con Prophet para {codigo}: {str(e)}")
+            logger.error(
+                f"Error al predecir con Prophet para {codigo}: {str(e)}",
+                extra={"sku": codigo, "evento": "error_prophet"}
+            )
     
     # Calcular MAPE promedio
     if count > 0:
@@ -355,51 +573,46 @@ def predecir_con_prophet(prophet_model, prophet_data):
     
     return resultados
 
-def calcular_consumo_mensual(row, month, year, dias_consumo_mensual, prophet_predictions, cols_consumo):
+def calcular_factor_crecimiento(consumos):
+    """Calcula el factor de tendencia reciente (últimos 3 meses) de un producto."""
+    try:
+        if len(consumos) >= 3:
+            ultimos_3 = [valor for valor in consumos[-3:] if valor > 0]
+            if len(ultimos_3) >= 2:
+                diff = np.diff(ultimos_3)
+                if len(diff) > 0 and np.mean(ultimos_3[:-1]) != 0:
+                    crecimiento = np.mean(diff) / np.mean(ultimos_3[:-1])
+                    return min(1.5, max(0.5, 1 + crecimiento))  # Limitar entre 0.5 y 1.5
+        return 1.0
+    except Exception as e:
+        logger.error(f"Error calculando tendencia: {str(e)}")
+        return 1.0
+
+def calcular_consumo_mensual(codigo, diario, historicos_mes, factor_crecimiento, month, year, dias_consumo_mensual, prophet_predictions):
     """Calcula el consumo mensual dinámico considerando múltiples factores."""
     try:
         # 1. Consumo base (promedio histórico)
-        consumo_base = row["DIARIO"] * dias_consumo_mensual
-        
-        # 2. Obtener histórico para este mes específico
-        mes_historico = f"{SPANISH_MONTHS[month].upper()[:3]}"
-        historicos_mes = [float(row[col]) for col in cols_consumo if mes_historico in col and pd.notna(row[col])]
+        consumo_base = diario * dias_consumo_mensual
         
-        # 3. Obtener predicción Prophet si existe
+        # 2. Obtener predicción Prophet si existe
         pred_prophet = None
-        if prophet_predictions and row["CODIGO"] in prophet_predictions:
+        if prophet_predictions and codigo in prophet_predictions:
             try:
                 pred = next(
-                    (p for p in prophet_predictions[row["CODIGO"]] 
+                    (p for p in prophet_predictions[codigo] 
                     if pd.to_datetime(p['ds']).month == month and pd.to_datetime(p['ds']).year == year),
                     None
                 )
                 if pred:
                     pred_prophet = pred['yhat'] * dias_consumo_mensual
             except Exception as e:
-                logger.error(f"Error obteniendo predicción Prophet: {str(e)}")
+                logger.error(
+                    f"Error obteniendo predicción Prophet para {codigo}: {str(e)}",
+                    extra={"sku": codigo, "evento": "error_prediccion_prophet"}
+                )
                 pred_prophet = None
         
-        # 4. Calcular tendencia reciente (últimos 3 meses)
-        try:
-            if len(cols_consumo) >= 3:
-                ultimos_3 = [float(row[col]) for col in cols_consumo[-3:] if pd.notna(row[col]) and float(row[col]) > 0]
-                if len(ultimos_3) >= 2:
-                    diff = np.diff(ultimos_3)
-                    if len(diff) > 0 and np.mean(ultimos_3[:-1]) != 0:
-                        crecimiento = np.mean(diff) / np.mean(ultimos_3[:-1])
-                        factor_crecimiento = min(1.5, max(0.5, 1 + crecimiento))  # Limitar entre 0.5 y 1.5
-                    else:
-                        factor_crecimiento = 1.0
-                else:
-                    factor_crecimiento = 1.0
-            else:
-                factor_crecimiento = 1.0
-        except Exception as e:
-            logger.error(f"Error calculando tendencia: {str(e)}")
-            factor_crecimiento = 1.0
-        
-        # 5. Lógica de combinación inteligente
+        # 3. Lógica de combinación inteligente
         if historicos_mes and pred_prophet:
             # Ponderación: 50% Prophet, 30% histórico del mes, 20% base
             historico_promedio = np.mean(historicos_mes)
@@ -415,18 +628,21 @@ def calcular_consumo_mensual(row, month, year, dias_consumo_mensual, prophet_pre
             # Solo consumo base
             consumo = consumo_base
         
-        # 6. Aplicar factor de crecimiento
+        # 4. Aplicar factor de crecimiento
         consumo *= factor_crecimiento
         
-        # 7. Asegurar mínimo razonable (al menos 50% del consumo base)
+        # 5. Asegurar mínimo razonable (al menos 50% del consumo base)
         consumo_minimo = consumo_base * 0.5
         consumo = max(consumo, consumo_minimo)
         
         return float(round(consumo, 2))
     
     except Exception as e:
-        logger.error(f"Error en calcular_consumo_mensual: {str(e)}")
-        return float(round(row["DIARIO"] * dias_consumo_mensual, 2))
+        logger.error(
+            f"Error en calcular_consumo_mensual para {codigo}: {str(e)}",
+            extra={"sku": codigo, "evento": "error_consumo_mensual"}
+        )
+        return float(round(diario * dias_consumo_mensual, 2))
 
 def sumar_dias_laborables(fecha_inicio, dias):
     """Suma días laborables (lunes a viernes) a una fecha inicial."""
@@ -441,25 +657,88 @@ def sumar_dias_laborables(fecha_inicio, dias):
             
     return fecha_actual
 
-def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccion, dias_transito, prophet_predictions=None):
+def clave_grupo_cubo(codigo, agrupacion):
+    """Obtiene la clave de agrupación de un producto a partir de su CODIGO."""
+    codigo = str(codigo).strip()
+    if agrupacion == "familia":
+        # Segmento anterior al primer guion (ej. "V7201-D" -> "V7201", "16-3601Q" -> "16")
+        return codigo.split("-")[0] or "SIN_FAMILIA"
+    if agrupacion == "prefijo":
+        # Prefijo alfabético o, si el código es numérico, sus dos primeros dígitos
+        match = re.match(r"[A-Za-z]+", codigo)
+        return match.group(0).upper() if match else codigo[:2] or "SIN_PREFIJO"
+    return None
+
+def acumular_producto_en_cubo(cubo, producto):
+    """Suma los aportes de un producto al cubo agregado.
+
+    Cada aporte se redondea a 2 decimales antes de sumarlo: así el cubo no depende del orden de
+    los productos y el backend, que al editar un producto resta sus aportes anteriores y suma
+    los nuevos, llega al mismo resultado que una reconstrucción completa.
+    """
+    grupo = clave_grupo_cubo(producto["CODIGO"], cubo["AGRUPACION"])
+    destinos = [cubo["TOTAL"]]
+    if grupo is not None:
+        destinos.append(cubo["GRUPOS"].setdefault(grupo, {}))
+
+    for proyeccion in producto.get("PROYECCIONES", []):
+        aportes = {
+            "productos": 1,
+            "consumo_mensual": proyeccion["consumo_mensual"],
+            "cajas_a_pedir": proyeccion["cajas_a_pedir"],
+            "unidades_a_pedir": proyeccion["unidades_a_pedir"],
+            "productos_en_alerta": 1 if proyeccion["alerta_stock"] else 0,
+            "stock_proyectado": proyeccion["stock_proyectado"]
+        }
+        for destino in destinos:
+            celda = destino.setdefault(proyeccion["mes"], dict.fromkeys(CUBO_METRICAS, 0))
+            for metrica, valor in aportes.items():
+                celda[metrica] = round(celda[metrica] + round(valor, 2), 2)
+
+def construir_cubo_agregado(resultados, agrupacion="familia"):
+    """Construye el cubo mes x métrica del catálogo, opcionalmente agrupado por familia o prefijo."""
+    cubo = {
+        "AGRUPACION": agrupacion,
+        "METRICAS": CUBO_METRICAS,
+        "TOTAL": {},
+        "GRUPOS": {}
+    }
+    for producto in resultados:
+        acumular_producto_en_cubo(cubo, producto)
+    return cubo
+
+def escalar_python(valor):
+    """Convierte un escalar de numpy al tipo de Python equivalente (como hace tolist)."""
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+def calcular_metricas_base(marco, dias_punto_reorden):
+    """Calcula de forma vectorizada las métricas base de todos los productos."""
+    if marco.cols_consumo:
+        prom_consu = marco.consumo.mean(axis=1, dtype=np.float64)
+    else:
+        prom_consu = np.zeros(len(marco), dtype=np.float64)
+    proyeccion = marco.productos["Proyec de  Conss"].to_numpy(dtype=np.float64)
+
+    prom_total = prom_consu + proyeccion
+    diario = prom_total / 22
+    ss = diario * 19
+
+    return pd.DataFrame({
+        "PROM CONSU": prom_consu,
+        "PROM CONS+Proyec": prom_total,
+        "DIARIO": diario,
+        "SS": ss,
+        "STOCK MINIMO (Prom + SS)": prom_total + ss,
+        f"PUNTO DE REORDEN ({dias_punto_reorden} días)": diario * dias_punto_reorden
+    })
+
+def calcular_predicciones(marco, ultima_fecha, fecha_inicio_prediccion, dias_transito, prophet_predictions=None, agrupacion_cubo="familia"):
     """Calcula las predicciones con consumos mensuales dinámicos."""
     try:
         logger.info("Calculando predicciones con consumos dinámicos...")
         logger.info(f"Fecha de inicio para predicciones: {fecha_inicio_prediccion}")
         logger.info(f"Días de tránsito: {dias_transito}")
         
-        # Convertir columnas numéricas y manejar valores nulos
-        numeric_cols = [col for col in df.columns[2:] if col not in ["CODIGO", "DESCRIPCION"]]
-        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-        df["UNID/CAJA"] = df["UNID/CAJA"].replace(0, 1)
-
-        # Cálculos base
-        df["PROM CONSU"] = df[cols_consumo].mean(axis=1)
-        df["Proyec de  Conss"] = pd.to_numeric(df.get("Proyec de  Conss", 0), errors='coerce').fillna(0)
-        df["PROM CONS+Proyec"] = df["PROM CONSU"] + df["Proyec de  Conss"]
-        df["DIARIO"] = df["PROM CONS+Proyec"] / 22
-        df["SS"] = df["DIARIO"] * 19
-        
         # Configuración de tiempos
         lead_time_days = 20
         alarma_stock_days = 22
@@ -467,9 +746,9 @@ def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccio
         max_dias_reposicion = 22
         dias_consumo_mensual = 20
 
-        # Métodos de cálculo
-        df["STOCK MINIMO (Prom + SS)"] = df["PROM CONS+Proyec"] + df["SS"]
-        df[f"PUNTO DE REORDEN ({dias_punto_reorden} días)"] = df["DIARIO"] * dias_punto_reorden
+        # Cálculos base (columnas derivadas en un marco aparte)
+        marco.derivados = calcular_metricas_base(marco, dias_punto_reorden)
+        cols_consumo = marco.cols_consumo
         
         # Generar predicciones mensuales
         resultados_completos = []
@@ -486,9 +765,22 @@ def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccio
         
         logger.info(f"Período de consumo inicial: {fecha_consumo_inicio.strftime('%Y-%m-%d')} a {fecha_consumo_fin.strftime('%Y-%m-%d')} ({dias_transito} días laborables)")
         
-        for _, row in df.iterrows():
-            if not isinstance(row["CODIGO"], str) or row["CODIGO"] == "Sin información":
-                continue
+        # Posiciones de cada mes del año en la matriz de consumo
+        indices_mes = {
+            mes: [j for j, (_, mes_col) in enumerate(marco.fechas_consumo) if mes_col == mes]
+            for mes in SPANISH_MONTHS
+        }
+        claves_historico = [col.split()[1] + "_" + col.split()[2] for col in cols_consumo]
+        
+        # Columnas como arreglos; cada fila se convierte a escalares de Python al recorrerla,
+        # sin materializar listas de todo el catálogo
+        valores = {col: marco.productos[col].to_numpy() for col in marco.productos.columns}
+        valores.update({col: marco.derivados[col].to_numpy() for col in marco.derivados.columns})
+        
+        for i in range(len(marco)):
+            consumos = marco.consumo[i].tolist()
+            row = {col: escalar_python(arreglo[i]) for col, arreglo in valores.items()}
+            factor_crecimiento = calcular_factor_crecimiento(consumos)
                 
             # 1. Inicialización de variables
             pedidos_pendientes = {}
@@ -536,12 +828,14 @@ def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccio
                 
                 # CÁLCULO DINÁMICO DEL CONSUMO MENSUAL (VERSIÓN MEJORADA)
                 consumo = calcular_consumo_mensual(
-                    row=row,
+                    codigo=row["CODIGO"],
+                    diario=row["DIARIO"],
+                    historicos_mes=[consumos[j] for j in indices_mes[month]],
+                    factor_crecimiento=factor_crecimiento,
                     month=month,
                     year=year,
                     dias_consumo_mensual=dias_consumo_mensual,
-                    prophet_predictions=prophet_predictions,
-                    cols_consumo=cols_consumo
+                    prophet_predictions=prophet_predictions
                 )
                 
                 # Resto de cálculos mensuales
@@ -632,10 +926,7 @@ def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccio
                 "FRECUENCIA_REPOSICION": float(round(frecuencia_reposicion, 2)),
                 "CONSUMO_PROYECTADO_ARRIBO": float(round(consumo_proyectado_arribo, 2)),
                 "STOCK_ACTUAL_AJUSTADO": float(round(stock_actual, 2)),
-                "HISTORICO_CONSUMOS": {
-                    col.split()[1] + "_" + col.split()[2]: float(row[col])
-                    for col in cols_consumo if len(col.split()) >= 3
-                },
+                "HISTORICO_CONSUMOS": dict(zip(claves_historico, consumos)),
                 "PROYECCIONES": proyecciones,
                 "CONFIGURACION": {
                     "DIAS_STOCK_SEGURIDAD": 19,
@@ -652,7 +943,10 @@ def calcular_predicciones(df, cols_consumo, ultima_fecha, fecha_inicio_prediccio
             
             resultados_completos.append(producto_info)
 
-        return df, resultados_completos
+        # Cubo agregado del catálogo (mes x métrica)
+        cubo = construir_cubo_agregado(resultados_completos, agrupacion_cubo)
+
+        return marco, resultados_completos, cubo
 
     except Exception as e:
         logger.error(f"Error en cálculos: {str(e)}")
@@ -690,56 +984,213 @@ def corregir_valores_nan(data):
     else:
         return data
 
+def requiere_correccion(data):
+    """Indica si corregir_valores_nan cambiaría algo, para evitar copiar resultados ya válidos."""
+    if isinstance(data, dict):
+        return any(es_nan(v) or requiere_correccion(v) for v in data.values())
+    if isinstance(data, list):
+        return any(item is None or requiere_correccion(item) for item in data)
+    return isinstance(data, float) and np.isnan(data)
+
+def construir_indice_eventos(resultados):
+    """Construye un índice ordenado por fecha de los eventos de reposición, solicitud y arribo."""
+    tipos_evento = {
+        "SOLICITUD": "fecha_solicitud",
+        "REPOSICION": "fecha_reposicion",
+        "ARRIBO": "fecha_arribo"
+    }
+
+    eventos = []
+    alertas = {}
+
+    for producto in resultados:
+        codigo = producto["CODIGO"]
+        for proyeccion in producto.get("PROYECCIONES", []):
+            # Solo se indexan los meses que requieren acción
+            if proyeccion["cajas_a_pedir"] <= 0 and not proyeccion["alerta_stock"]:
+                continue
+
+            for tipo, campo in tipos_evento.items():
+                fecha = proyeccion.get(campo, "No aplica")
+                if fecha == "No aplica":
+                    continue
+                eventos.append({
+                    "fecha": fecha,
+                    "tipo": tipo,
+                    "CODIGO": codigo,
+                    "mes": proyeccion["mes"],
+                    "cajas_a_pedir": proyeccion["cajas_a_pedir"],
+                    "unidades_a_pedir": proyeccion["unidades_a_pedir"],
+                    "alerta_stock": proyeccion["alerta_stock"]
+                })
+
+            if proyeccion["alerta_stock"]:
+                alertas.setdefault(codigo, []).append(proyeccion["mes"])
+
+    # Orden por fecha y código para búsquedas por rango en el backend (búsqueda binaria)
+    eventos.sort(key=lambda e: (e["fecha"], e["CODIGO"], e["tipo"]))
+
+    return {
+        "FECHA_INICIO": resultados[0]["FECHA_INICIO"] if resultados else None,
+        "TOTAL_EVENTOS": len(eventos),
+        "FECHAS": [e["fecha"] for e in eventos],
+        "EVENTOS": eventos,
+        "ALERTAS": dict(sorted(alertas.items()))
+    }
+
+def guardar_indice_eventos(resultados):
+    """Guarda el índice de eventos junto a las predicciones."""
+    try:
+        indice = construir_indice_eventos(resultados)
+        output_path = os.path.join(OUTPUT_DIR, 'indice_eventos.json')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, ensure_ascii=False)
+
+        logger.info(f"Índice de eventos guardado en {output_path} ({indice['TOTAL_EVENTOS']} eventos)")
+
+    except Exception as e:
+        logger.error(f"Error al guardar índice de eventos: {str(e)}")
+        sys.exit(1)
+
+def guardar_cubo_agregado(cubo):
+    """Guarda el cubo agregado del catálogo para reportes y dashboards."""
+    try:
+        output_path = os.path.join(OUTPUT_DIR, 'cubo_agregado.json')
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(corregir_valores_nan(cubo), f, ensure_ascii=False)
+
+        logger.info(f"Cubo agregado guardado en {output_path} ({len(cubo['TOTAL'])} meses, {len(cubo['GRUPOS'])} grupos)")
+
+    except Exception as e:
+        logger.error(f"Error al guardar cubo agregado: {str(e)}")
+        sys.exit(1)
+
+def cargar_resultados_anteriores():
+    """Carga las predicciones de la ejecución anterior, si existen."""
+    try:
+        if not args.previous or not os.path.exists(args.previous):
+            logger.info("No hay predicciones anteriores; el delta incluirá todos los productos")
+            return []
+
+        with open(args.previous, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    except Exception as e:
+        logger.warning(f"No se pudieron cargar las predicciones anteriores: {str(e)}")
+        return []
+
+def guardar_delta(delta):
+    """Guarda el delta respecto a la ejecución anterior."""
+    try:
+        output_path = os.path.join(OUTPUT_DIR, 'predicciones_delta.json')
+        escribir_delta(delta, output_path)
+
+        logger.info(
+            f"Delta guardado en {output_path}: {len(delta['AGREGADOS'])} agregados, "
+            f"{len(delta['MODIFICADOS'])} modificados, {len(delta['ELIMINADOS'])} eliminados, "
+            f"{delta['SIN_CAMBIOS']} sin cambios"
+        )
+
+    except Exception as e:
+        logger.error(f"Error al guardar delta: {str(e)}")
+        sys.exit(1)
+
+def escribir_json_minificado(resultados, ruta):
+    """Escribe la lista de resultados producto a producto, con la misma salida que json.dump.
+
+    Evita construir en memoria la cadena de todo el catálogo. Devuelve False, sin terminar el
+    archivo, si algún producto serializado contiene NaN, null o None.
+    """
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for i, producto in enumerate(resultados):
+            fragmento = json.dumps(producto, ensure_ascii=False)
+            if "NaN" in fragmento or "null" in fragmento or "None" in fragmento:
+                return False
+            f.write(", " if i else "")
+            f.write(fragmento)
+        f.write("]")
+    return True
+
 def guardar_resultados(resultados_completos):
     """Guarda los resultados en un único archivo JSON."""
     try:
-        # Asegurar que el directorio data existe
-        os.makedirs(DATA_DIR, exist_ok=True)
+        # Asegurar que el directorio de salida existe
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
         
-        # Validar y corregir valores NaN en los resultados
-        resultados_validados = corregir_valores_nan(resultados_completos)
+        # Validar y corregir valores NaN en los resultados (solo se copian si hay algo que corregir)
+        resultados_validados = resultados_completos
+        if requiere_correccion(resultados_completos):
+            resultados_validados = corregir_valores_nan(resultados_completos)
         
-        # Verificar si hay algún valor NaN o None en el JSON final
-        json_str = json.dumps(resultados_validados)
-        if "NaN" in json_str or "null" in json_str or "None" in json_str:
+        # JSON minificado (más eficiente para procesamiento), escrito producto a producto a un
+        # temporal; la escritura se detiene si aparece algún valor NaN o None en el JSON final
+        output_path_min = os.path.join(OUTPUT_DIR, 'predicciones_completas.min.json')
+        output_path_tmp = f"{output_path_min}.{os.getpid()}.tmp"
+        if not escribir_json_minificado(resultados_validados, output_path_tmp):
+            json_str = json.dumps(resultados_validados, ensure_ascii=False)
             logger.warning("Todavía existen valores NaN o null en el JSON. Aplicando corrección adicional.")
             # Convertir a objeto Python y volver a validar
             obj = json.loads(json_str.replace("NaN", "0").replace("null", "0").replace("None", "\"Sin información\""))
             resultados_validados = corregir_valores_nan(obj)
             # Verificar de nuevo
-            json_str = json.dumps(resultados_validados)
+            json_str = json.dumps(resultados_validados, ensure_ascii=False)
             if "NaN" in json_str or "null" in json_str or "None" in json_str:
                 logger.error("No se pudieron corregir todos los valores nulos, se procederá a una limpieza más agresiva")
                 json_str = json_str.replace("NaN", "0").replace("null", "0").replace("None", "\"Sin información\"")
                 resultados_validados = json.loads(json_str)
+                json_str = json.dumps(resultados_validados, ensure_ascii=False)
+
+            with open(output_path_tmp, 'w', encoding='utf-8') as f:
+                f.write(json_str)
+            del json_str
+
+        # Leer la ejecución anterior antes de sobrescribirla (puede ser el mismo archivo minificado)
+        resultados_anteriores = None if args.sin_delta else cargar_resultados_anteriores()
+        os.replace(output_path_tmp, output_path_min)
+        logger.info(f"Resultados guardados en formato minificado en {output_path_min}")
         
         # Guardar en un único archivo JSON
-        output_path = os.path.join(DATA_DIR, 'predicciones_completas.json')
+        output_path = os.path.join(OUTPUT_DIR, 'predicciones_completas.json')
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(resultados_validados, f, indent=4, ensure_ascii=False)
             
         logger.info(f"Resultados guardados exitosamente en {output_path}")
-        
-        # Guardar como JSON minificado también (más eficiente para procesamiento)
-        output_path_min = os.path.join(DATA_DIR, 'predicciones_completas.min.json')
-        with open(output_path_min, 'w', encoding='utf-8') as f:
-            json.dump(resultados_validados, f, ensure_ascii=False)
-            
-        logger.info(f"Resultados guardados en formato minificado en {output_path_min}")
-        
+
+        # Índice secundario de eventos para consultas por rango de fechas
+        guardar_indice_eventos(resultados_validados)
+
+        # Delta respecto a la ejecución anterior (solo productos nuevos, eliminados o modificados)
+        if not args.sin_delta:
+            guardar_delta(calcular_delta(resultados_validados, resultados_anteriores))
+
     except Exception as e:
         logger.error(f"Error al guardar: {str(e)}")
         sys.exit(1)
 
+def lanzar_graficos(ruta_predicciones, dir_graficos):
+    """Lanza graficos.py en un proceso independiente para no retrasar el resultado principal."""
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'graficos.py'),
+             '--predicciones', ruta_predicciones, '--dir_graficos', dir_graficos],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        logger.info("Generación de gráficos lanzada en segundo plano")
+    except Exception as e:
+        logger.warning(f"No se pudo lanzar la generación de gráficos: {str(e)}")
+
 def main():
     try:
         logger.info("=== INICIO DEL PROCESO ===")
         logger.info(f"Directorio base: {BASE_DIR}")
         logger.info(f"Directorio de datos: {DATA_DIR}")
+        logger.info(f"Directorio de salida: {OUTPUT_DIR}")
         logger.info(f"Directorio de modelos: {MODELS_DIR}")
         
         # Cargar datos
-        df, cols_consumo, ultima_fecha, fecha_inicio_prediccion = cargar_datos()
+        marco, ultima_fecha, fecha_inicio_prediccion = cargar_datos()
                 
         # Cargar modelo Prophet
         prophet_model = cargar_modelo_prophet()
@@ -747,17 +1198,27 @@ def main():
         # Preparar datos para Prophet si el modelo está disponible
         prophet_predictions = None
         if prophet_model:
-            prophet_data = preparar_datos_prophet(df, cols_consumo)
+            prophet_data = preparar_datos_prophet(marco)
             prophet_predictions = predecir_con_prophet(prophet_model, prophet_data)
         
         # Calcular predicciones
-        _, resultados_completos = calcular_predicciones(
-            df, cols_consumo, ultima_fecha, 
-            fecha_inicio_prediccion, args.dias_transito, prophet_predictions
+        _, resultados_completos, cubo = calcular_predicciones(
+            marco, ultima_fecha, 
+            fecha_inicio_prediccion, args.dias_transito, prophet_predictions,
+            args.agrupacion_cubo
         )
 
         # Guardar resultados
         guardar_resultados(resultados_completos)
+        guardar_cubo_agregado(cubo)
+
+        # Con --output_dir los gráficos quedan junto a esa salida; los de data/graficos
+        # corresponden solo a las predicciones publicadas
+        if not args.sin_graficos:
+            lanzar_graficos(
+                os.path.join(OUTPUT_DIR, 'predicciones_completas.min.json'),
+                os.path.join(OUTPUT_DIR, 'graficos')
+            )
         
         logger.info("=== PROCESO COMPLETADO ===")
         sys.exit(0)
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope='session')
+def predict(tmp_path_factory):
+    # predict.py lee sus argumentos al importarse
+    log_file = tmp_path_factory.mktemp('logs') / 'prediction_log.txt'
+    argv = sys.argv
+    sys.argv = ['predict.py', '--log_file', str(log_file), '--log_level', 'ERROR']
+    sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+    try:
+        import predict
+    finally:
+        sys.argv = argv
+    return predict
@@ -0,0 +1,60 @@
+"""Pruebas del delta entre ejecuciones (delta.py)."""
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICCIONES = os.path.join(BASE_DIR, 'data', 'predicciones_completas.min.json')
+
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+import delta  # noqa: E402
+
+@pytest.fixture(scope='module')
+def predicciones():
+    with open(PREDICCIONES, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def como_json_stringify(valor):
+    """Reproduce el ida y vuelta por JSON.stringify del backend (1.0 se guarda como 1)."""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, dict):
+        return {k: como_json_stringify(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [como_json_stringify(v) for v in valor]
+    return valor
+
+def test_delta_sin_cambios_tras_reescritura_del_backend(predicciones):
+    anteriores = json.loads(json.dumps(como_json_stringify(predicciones)))
+
+    resultado = delta.calcular_delta(predicciones, anteriores)
+
+    assert resultado["SIN_CAMBIOS"] == len(predicciones)
+    assert resultado["MODIFICADOS"] == {}
+    assert resultado["AGREGADOS"] == []
+    assert resultado["ELIMINADOS"] == []
+
+def test_hash_producto_ignora_formato_numerico(predicciones):
+    producto = predicciones[0]
+    assert delta.hash_producto(producto) == delta.hash_producto(como_json_stringify(producto))
+
+def test_delta_solo_incluye_campos_modificados(predicciones):
+    anteriores = como_json_stringify(predicciones)
+    nuevos = copy.deepcopy(predicciones)
+    nuevos[0]["STOCK_FISICO"] += 10
+    eliminado = nuevos.pop()
+
+    resultado = delta.calcular_delta(nuevos, anteriores)
+
+    assert resultado["MODIFICADOS"] == {nuevos[0]["CODIGO"]: {"STOCK_FISICO": nuevos[0]["STOCK_FISICO"]}}
+    assert resultado["ELIMINADOS"] == [eliminado["CODIGO"]]
+    assert resultado["SIN_CAMBIOS"] == len(nuevos) - 1
+
+def test_delta_publicado_corresponde_a_las_predicciones(predicciones):
+    with open(os.path.join(BASE_DIR, 'data', 'predicciones_delta.json'), 'r', encoding='utf-8') as f:
+        publicado = json.load(f)
+
+    assert publicado["HASHES"] == {p["CODIGO"]: delta.hash_producto(p) for p in predicciones}
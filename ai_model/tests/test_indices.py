@@ -0,0 +1,161 @@
+"""Pruebas de los archivos derivados de las predicciones (cubo agregado e índice de eventos).
+
+El backend los mantiene de forma incremental al editar un producto (utils/predictionIndexes.js);
+aquí se comprueba que esa actualización coincide con la reconstrucción completa de predict.py.
+"""
+import copy
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICCIONES = os.path.join(BASE_DIR, 'data', 'predicciones_completas.min.json')
+MODULO_JS = os.path.join(os.path.dirname(BASE_DIR), 'backend', 'utils', 'predictionIndexes.js')
+
+requiere_node = pytest.mark.skipif(shutil.which('node') is None, reason='node no está instalado')
+
+@pytest.fixture(scope='module')
+def predicciones():
+    with open(PREDICCIONES, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def ejecutar_js(codigo, datos):
+    """Ejecuta `codigo` con el módulo del backend importado como `m` y los datos en `datos`."""
+    script = (
+        f"import * as m from {json.dumps('file://' + MODULO_JS)};\n"
+        "let entrada = '';\n"
+        "for await (const trozo of process.stdin) entrada += trozo;\n"
+        "const datos = JSON.parse(entrada);\n"
+        f"{codigo}\n"
+    )
+    resultado = subprocess.run(
+        ['node', '--input-type=module', '-e', script],
+        input=json.dumps(datos), capture_output=True, text=True, check=True
+    )
+    return json.loads(resultado.stdout)
+
+def proyeccion(mes, consumo, stock, cajas=0, alerta=False):
+    return {
+        "mes": mes,
+        "consumo_mensual": consumo,
+        "cajas_a_pedir": cajas,
+        "unidades_a_pedir": cajas * 12.0,
+        "alerta_stock": alerta,
+        "stock_proyectado": stock,
+        "fecha_solicitud": "2025-01-06" if cajas else "No aplica",
+        "fecha_reposicion": "2025-01-20" if cajas else "No aplica",
+        "fecha_arribo": "2025-01-27" if cajas else "No aplica"
+    }
+
+def productos_de_prueba():
+    # Valores con empates de redondeo (x.125, x.375), binarios inexactos (2.675) y muchos decimales
+    return [
+        {"CODIGO": "V7201-D", "FECHA_INICIO": "2025-01-01", "PROYECCIONES": [
+            proyeccion("ENE-2025", 0.125, 10.375, cajas=2, alerta=True),
+            proyeccion("FEB-2025", 2.675, -3.125)
+        ]},
+        {"CODIGO": "V7201-A", "FECHA_INICIO": "2025-01-01", "PROYECCIONES": [
+            proyeccion("ENE-2025", 1 / 3, 100.0),
+            proyeccion("FEB-2025", 1.005, 98.625, cajas=1)
+        ]},
+        {"CODIGO": "16-3601Q", "FECHA_INICIO": "2025-01-01", "PROYECCIONES": [
+            proyeccion("ENE-2025", 7.0, 0.0, alerta=True)
+        ]}
+    ]
+
+def test_cubo_no_depende_del_orden_de_los_productos(predict, predicciones):
+    desordenadas = predicciones[:]
+    random.Random(0).shuffle(desordenadas)
+
+    assert predict.construir_cubo_agregado(desordenadas) == predict.construir_cubo_agregado(predicciones)
+
+@requiere_node
+@pytest.mark.parametrize('agrupacion', ['familia', 'prefijo', 'ninguna'])
+@pytest.mark.parametrize('nuevas_proyecciones', [
+    [proyeccion("ENE-2025", 0.375, 12.125, cajas=1), proyeccion("MAR-2025", 5.555, 1.875, alerta=True)],
+    []
+], ids=['cambia_meses', 'sin_proyecciones'])
+def test_cubo_incremental_coincide_con_reconstruccion(predict, agrupacion, nuevas_proyecciones):
+    anteriores = productos_de_prueba()
+    nuevos = copy.deepcopy(anteriores)
+    nuevos[2]["PROYECCIONES"] = nuevas_proyecciones
+
+    cubo = ejecutar_js(
+        "m.accumulateProductInCube(datos.cubo, datos.anterior, -1);\n"
+        "m.accumulateProductInCube(datos.cubo, datos.nuevo, 1);\n"
+        "console.log(JSON.stringify(datos.cubo));",
+        {
+            "cubo": predict.construir_cubo_agregado(anteriores, agrupacion),
+            "anterior": anteriores[2],
+            "nuevo": nuevos[2]
+        }
+    )
+
+    assert cubo == predict.construir_cubo_agregado(nuevos, agrupacion)
+
+@requiere_node
+def test_cubo_incremental_coincide_con_reconstruccion_del_catalogo(predict, predicciones):
+    nuevas = copy.deepcopy(predicciones)
+    for proy in nuevas[0]["PROYECCIONES"]:
+        proy["consumo_mensual"] = proy["consumo_mensual"] * 1.137
+        proy["stock_proyectado"] = proy["stock_proyectado"] / 3
+
+    cubo = ejecutar_js(
+        "m.accumulateProductInCube(datos.cubo, datos.anterior, -1);\n"
+        "m.accumulateProductInCube(datos.cubo, datos.nuevo, 1);\n"
+        "console.log(JSON.stringify(datos.cubo));",
+        {
+            "cubo": predict.construir_cubo_agregado(predicciones),
+            "anterior": predicciones[0],
+            "nuevo": nuevas[0]
+        }
+    )
+
+    assert cubo == predict.construir_cubo_agregado(nuevas)
+
+@requiere_node
+def test_redondeo_del_backend_coincide_con_python():
+    valores = [0.125, 0.375, -0.125, 2.675, 1.005, 12.625, 1 / 3, -3.14159, 1e6 + 0.125, 0.0, 7]
+
+    redondeados = ejecutar_js(
+        "console.log(JSON.stringify(datos.map(m.roundLikePython)));",
+        valores
+    )
+
+    assert redondeados == [round(v, 2) for v in valores]
+
+@requiere_node
+@pytest.mark.parametrize('editar', [
+    lambda p: p["PROYECCIONES"].append(proyeccion("MAR-2025", 1.0, -2.0, cajas=3, alerta=True)),
+    lambda p: p.update(PROYECCIONES=[]),
+    lambda p: p["PROYECCIONES"][0].update(alerta_stock=False, cajas_a_pedir=0)
+], ids=['agrega_eventos', 'sin_proyecciones', 'quita_alerta'])
+def test_indice_eventos_incremental_coincide_con_reconstruccion(predict, editar):
+    anteriores = productos_de_prueba()
+    nuevos = copy.deepcopy(anteriores)
+    editar(nuevos[0])
+
+    indice = ejecutar_js(
+        "console.log(JSON.stringify(m.replaceProductEvents(datos.indice, datos.nuevo)));",
+        {"indice": predict.construir_indice_eventos(anteriores), "nuevo": nuevos[0]}
+    )
+
+    assert indice == predict.construir_indice_eventos(nuevos)
+
+@requiere_node
+def test_indice_eventos_incremental_coincide_con_reconstruccion_del_catalogo(predict, predicciones):
+    nuevas = copy.deepcopy(predicciones)
+    producto = next(p for p in nuevas if p["CODIGO"] in predict.construir_indice_eventos(predicciones)["ALERTAS"])
+    for proy in producto["PROYECCIONES"]:
+        proy["alerta_stock"] = not proy["alerta_stock"]
+
+    indice = ejecutar_js(
+        "console.log(JSON.stringify(m.replaceProductEvents(datos.indice, datos.nuevo)));",
+        {"indice": predict.construir_indice_eventos(predicciones), "nuevo": producto}
+    )
+
+    assert indice == predict.construir_indice_eventos(nuevas)
@@ -0,0 +1,30 @@
+"""Pruebas del logging estructurado de predict.py."""
+import json
+import logging
+import queue
+import sys
+
+def registro_con_excepcion():
+    try:
+        raise ValueError("valor inválido")
+    except ValueError:
+        return logging.getLogger("prueba").makeRecord(
+            "prueba", logging.ERROR, __file__, 1, "Error en %s", ("V7201-D",), sys.exc_info(),
+            extra={"sku": "V7201-D"}
+        )
+
+def test_excepcion_se_registra_como_campo_aparte(predict):
+    preparado = predict.ColaLogsEstructurada(queue.SimpleQueue()).prepare(registro_con_excepcion())
+
+    salida = json.loads(predict.FormateadorJSON().format(preparado))
+
+    assert salida["mensaje"] == "Error en V7201-D"
+    assert salida["sku"] == "V7201-D"
+    assert salida["excepcion"].endswith("ValueError: valor inválido")
+
+def test_formato_texto_conserva_la_traza(predict):
+    preparado = predict.ColaLogsEstructurada(queue.SimpleQueue()).prepare(registro_con_excepcion())
+
+    salida = logging.Formatter('%(levelname)s - %(message)s').format(preparado)
+
+    assert salida.startswith("ERROR - Error en V7201-D\nTraceback")
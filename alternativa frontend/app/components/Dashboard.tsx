@@ -1372,6 +1372,20 @@ const Dashboard = () => {
         });
     }
 
+    // Consulta el estado de un trabajo de predicción hasta que termina
+    const waitForPredictionJob = async (jobId: string) => {
+        while (true) {
+            await new Promise((resolve) => setTimeout(resolve, 3000));
+            const jobResponse = await axios.get(`${API_URL}/predictions/jobs/${jobId}`);
+            const job = jobResponse.data.data;
+
+            if (job.status === 'completed') return;
+            if (job.status === 'failed' || job.status === 'cancelled') {
+                throw new Error(job.error || `El procesamiento terminó con estado ${job.status}`);
+            }
+        }
+    };
+
     const handleProcessFile = async () => {
         if (!selectedFile) return;
 
@@ -1386,10 +1400,13 @@ const Dashboard = () => {
                 headers: {
                     'Content-Type': 'multipart/form-data'
                 },
-                timeout: 30000
+                // El servidor responde como máximo al minuto (202 si el trabajo sigue en cola)
+                timeout: 90000
             });
 
-            if (!response.data.success) {
+            if (response.data.pending) {
+                await waitForPredictionJob(response.data.data.id);
+            } else if (!response.data.success) {
                 throw new Error(response.data.error || 'Error al procesar el archivo');
             }
 
@@ -14,6 +14,7 @@ import sequelize from './config/db.js';
 import User from './models/user.model.js'; // Importa tus modelos
 import reportsRouter from './routes/reports.routes.js';
 import productsRouter from './routes/products.routes.js';
+import chartsRouter from './routes/charts.routes.js';
 
 // Configuración del puerto
 const PORT = process.env.PORT || 3500;
@@ -56,6 +57,7 @@ app.use('/api/predictions', limiter, predictionsRouter);
 app.use('/api/alertas', alertRoutes);
 app.use('/api/reports', reportsRouter);
 app.use('/api/products', productsRouter);
+app.use('/api/charts', chartsRouter);
 
 app.get('/api/protected', verifyToken, (req, res) => {
     res.json({ message: 'Ruta protegida', user: req.user });
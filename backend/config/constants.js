@@ -13,6 +13,8 @@ const resolvePath = (relativePath) => path.resolve(__dirname, relativePath);
 export const PATHS = {
     AI_MODEL_DIR: path.join(process.cwd(), 'ai_model'),
     PREDICTIONS_FILE: path.join(process.cwd(), 'ai_model', 'data', 'predicciones_completas.min.json'),
+    CHARTS_DIR: path.join(process.cwd(), 'ai_model', 'data', 'graficos'),
+    PREDICTION_JOBS_DIR: process.env.PREDICTION_JOBS_DIR || path.join(process.cwd(), 'ai_model', 'jobs'),
     UPLOADS_DIR: path.join(process.cwd(), 'uploads'),
     EXCEL_TEMPLATE: resolvePath('../../ai_model/data/PRUEBA PASANTIAS EPN.xlsx'),
     LOGS_DIR: process.env.LOGS_DIR || resolvePath('../logs'), // 📌 Nueva ruta de logs con fallback
@@ -1,4 +1,40 @@
 import AlertService from '../services/alert.service.js';
+import { logger } from '../utils/logger.js';
+
+const TIPOS_EVENTO = ['SOLICITUD', 'REPOSICION', 'ARRIBO'];
+
+export const obtenerEventosProximos = async (req, res) => {
+    const dias = req.query.days === undefined ? 7 : parseInt(req.query.days, 10);
+    const tipo = req.query.type ? String(req.query.type).toUpperCase() : null;
+
+    if (isNaN(dias) || dias < 0) {
+        return res.status(400).json({ success: false, error: 'El número de días debe ser un entero mayor o igual a 0.' });
+    }
+    if (tipo && !TIPOS_EVENTO.includes(tipo)) {
+        return res.status(400).json({ success: false, error: `Tipo inválido. Use: ${TIPOS_EVENTO.join(', ')}.` });
+    }
+
+    try {
+        const resultado = await AlertService.obtenerEventosProximos(dias, tipo);
+        return res.status(200).json({
+            success: true,
+            data: resultado,
+            metadata: {
+                days: dias,
+                type: tipo,
+                events: resultado.eventos.length,
+                products: Object.keys(resultado.productos).length,
+            },
+        });
+    } catch (error) {
+        logger.error(`Error obteniendo eventos próximos: ${error.message}`);
+        return res.status(500).json({
+            success: false,
+            error: 'Error interno al obtener los eventos próximos.',
+            details: process.env.NODE_ENV === 'development' ? error.message : undefined,
+        });
+    }
+};
 
 export const evaluarAlertaYNotificar = async (req, res) => {
     const { predictionData, email, isManual = false } = req.body;
@@ -19,6 +19,49 @@ export const getPredictions = async (req, res) => {
     }
 };
 
+export const getPredictionsDelta = async (req, res) => {
+    try {
+        const delta = await pythonService.getLatestDelta();
+        const { HASHES, ...changes } = delta;
+
+        res.json({
+            success: true,
+            data: changes,
+            metadata: {
+                added: delta.AGREGADOS.length,
+                removed: delta.ELIMINADOS.length,
+                changed: Object.keys(delta.MODIFICADOS).length,
+                unchanged: delta.SIN_CAMBIOS
+            }
+        });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_GET_DELTA', error);
+    }
+};
+
+export const getAggregationCube = async (req, res) => {
+    try {
+        const cube = await pythonService.getAggregationCube();
+        const { group } = req.query;
+
+        if (group && !cube.GRUPOS[group]) {
+            return handleHttpError(res, 'GROUP_NOT_FOUND', new Error(`Grupo ${group} no encontrado`), 404);
+        }
+
+        res.json({
+            success: true,
+            data: group ? { AGRUPACION: cube.AGRUPACION, GRUPO: group, MESES: cube.GRUPOS[group] } : cube,
+            metadata: {
+                grouping: cube.AGRUPACION,
+                groups: Object.keys(cube.GRUPOS).length,
+                months: Object.keys(cube.TOTAL).length
+            }
+        });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_GET_CUBE', error);
+    }
+};
+
 export const getPredictionByCode = async (req, res) => {
     try {
         const { code } = req.params;
@@ -37,6 +80,42 @@ export const getPredictionByCode = async (req, res) => {
     }
 };
 
+export const getPredictionChart = async (req, res) => {
+    try {
+        const { code } = req.params;
+        const urls = await pythonService.getChartUrls(code);
+
+        if (!urls) {
+            return handleHttpError(res, 'CHART_NOT_FOUND', new Error(`Gráfico no disponible para ${code}`), 404);
+        }
+
+        res.json({ success: true, data: { codigo: code, url: urls.url, url_version: urls.versionUrl } });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_GET_CHART', error);
+    }
+};
+
+export const getPredictionChartImage = async (req, res) => {
+    try {
+        const { code } = req.params;
+        const file = await pythonService.getChartFile(code);
+
+        if (!file) {
+            return handleHttpError(res, 'CHART_NOT_FOUND', new Error(`Gráfico no disponible para ${code}`), 404);
+        }
+
+        // La URL no cambia pero la imagen sí: el cliente revalida siempre (ETag)
+        res.set('Cross-Origin-Resource-Policy', 'cross-origin');
+        res.sendFile(file, { cacheControl: false, headers: { 'Cache-Control': 'no-cache' } }, (error) => {
+            if (error && !res.headersSent) {
+                handleHttpError(res, 'CHART_NOT_FOUND', error, 404);
+            }
+        });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_GET_CHART', error);
+    }
+};
+
 export const refreshPredictions = async (req, res) => {
     try {
         if (!req.file) {
@@ -47,7 +126,8 @@ export const refreshPredictions = async (req, res) => {
             return handleHttpError(res, 'INVALID_FILE_TYPE', new Error('El archivo debe ser un documento Excel'), 400);
         }
 
-        const updatedData = await pythonService.processExcel(req.file);
+        const priority = parseInt(req.body?.priority, 10) || 0;
+        const updatedData = await pythonService.processExcel(req.file, 0, { priority });
         
         res.json({
             success: true,
@@ -60,10 +140,65 @@ export const refreshPredictions = async (req, res) => {
             }
         });
     } catch (error) {
+        // El trabajo sigue en la cola; el cliente consulta su estado en /jobs/:id hasta que termine
+        if (error.code === 'JOB_PENDING') {
+            return res.status(202).json({
+                success: false,
+                pending: true,
+                message: 'Predicción en proceso',
+                data: { ...pythonService.getJobStatus(error.jobId), subscriptionId: error.subscriptionId }
+            });
+        }
+        if (error.code === 'JOB_CANCELLED') {
+            return handleHttpError(res, 'JOB_CANCELLED', error, 409);
+        }
         handleHttpError(res, 'ERROR_REFRESH_PREDICTIONS', error);
     }
 };
 
+export const listPredictionJobs = async (req, res) => {
+    try {
+        const jobs = pythonService.listJobs();
+        res.json({ success: true, data: jobs, metadata: { count: jobs.length } });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_LIST_JOBS', error);
+    }
+};
+
+export const getPredictionJob = async (req, res) => {
+    try {
+        const job = pythonService.getJobStatus(req.params.id);
+        if (!job) {
+            return handleHttpError(res, 'NOT_FOUND', new Error(`Trabajo ${req.params.id} no encontrado`), 404);
+        }
+        res.json({ success: true, data: job });
+    } catch (error) {
+        handleHttpError(res, 'ERROR_GET_JOB', error);
+    }
+};
+
+export const cancelPredictionJob = async (req, res) => {
+    try {
+        const { subscription } = req.query;
+        if (!subscription) {
+            return handleHttpError(res, 'MISSING_SUBSCRIPTION',
+                new Error('Debe indicar la suscripción recibida al enviar el archivo (?subscription=)'), 400);
+        }
+
+        const job = await pythonService.cancelJob(req.params.id, subscription);
+        let message = 'Trabajo cancelado';
+        if (['pending', 'running'].includes(job.status)) {
+            message = `Suscripción cancelada; el trabajo continúa para ${job.subscribers} solicitante(s)`;
+        } else if (job.status !== 'cancelled') {
+            message = `El trabajo ya había finalizado (${job.status})`;
+        }
+        res.json({ success: true, message, data: job });
+    } catch (error) {
+        const notFound = error.code === 'SUBSCRIPTION_NOT_FOUND' || error.message.includes('no encontrado');
+        handleHttpError(res, 'ERROR_CANCEL_JOB', error, notFound ? 404 : 500);
+    }
+};
+
 export const applyTransitUnits = async (req, res) => {
     try {
         const { code } = req.params;
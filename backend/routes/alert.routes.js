@@ -1,9 +1,10 @@
 // src/routes/alert.routes.js
 import express from 'express';
-import { evaluarAlertaYNotificar } from '../controllers/alert.controller.js';
+import { evaluarAlertaYNotificar, obtenerEventosProximos } from '../controllers/alert.controller.js';
 
 const router = express.Router();
 
 router.post('/stock', evaluarAlertaYNotificar);
+router.get('/eventos', obtenerEventosProximos);
 
 export default router;
@@ -0,0 +1,20 @@
+import express, { Router } from 'express';
+import path from 'path';
+import { PATHS } from '../config/constants.js';
+import { getPredictionChartImage } from '../controllers/predictions.controller.js';
+
+const router = Router();
+
+// URL estable por producto, la que se guarda en los reportes: siempre sirve el gráfico vigente
+router.get('/productos/:code', getPredictionChartImage);
+
+// Versiones concretas: el nombre incluye el hash de los datos, así que pueden cachearse sin
+// caducidad. Solo se sirven los PNG; el índice y el archivo de bloqueo cambian y no son públicos
+router.use((req, res, next) => (path.extname(req.path) === '.png' ? next() : next('router')));
+router.use(express.static(PATHS.CHARTS_DIR, {
+    immutable: true,
+    maxAge: '30d',
+    setHeaders: (res) => res.set('Cross-Origin-Resource-Policy', 'cross-origin')
+}));
+
+export default router;
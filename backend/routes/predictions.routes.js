@@ -2,7 +2,13 @@ import { Router } from 'express';
 import { 
     getPredictions,
     getPredictionByCode,
+    getPredictionChart,
+    getPredictionsDelta,
+    getAggregationCube,
     refreshPredictions,
+    listPredictionJobs,
+    getPredictionJob,
+    cancelPredictionJob,
     applyTransitUnits,
     applyTransitDays,
     applyTransitDaysToProjection, // Nuevo controlador importado
@@ -12,9 +18,17 @@ import { uploadMiddleware } from '../middlewares/upload.middleware.js';
 import PythonService from '../services/python.service.js'
 const router = Router();
 
+// Trabajos de predicción (antes de '/:code' para no confundirlos con un código)
+router.get('/jobs', listPredictionJobs);
+router.get('/jobs/:id', getPredictionJob);
+router.delete('/jobs/:id', cancelPredictionJob);
+
 // Rutas existentes
 router.get('/', getPredictions);
+router.get('/delta', getPredictionsDelta);
+router.get('/cube', getAggregationCube);
 router.get('/:code', getPredictionByCode);
+router.get('/:code/chart', getPredictionChart);
 router.post('/refresh', uploadMiddleware.single('excel'), refreshPredictions);
 
 // Rutas para gestión de tránsito
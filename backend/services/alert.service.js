@@ -1,6 +1,7 @@
 // src/services/alert.service.js
 import nodemailer from 'nodemailer';
 import { logger } from '../utils/logger.js';
+import pythonService from './python.service.js';
 import dotenv from 'dotenv';
 dotenv.config();
 
@@ -146,6 +147,25 @@ class AlertService {
         `;
     }
 
+    // Solicitudes, reposiciones y arribos de los próximos días, agrupados por producto
+    async obtenerEventosProximos(dias = 7, tipo = null) {
+        const eventos = await pythonService.getUpcomingEvents(dias, new Date(), tipo);
+
+        const porProducto = {};
+        eventos.forEach((evento) => {
+            porProducto[evento.CODIGO] = porProducto[evento.CODIGO] || [];
+            porProducto[evento.CODIGO].push(evento);
+        });
+
+        return {
+            eventos,
+            productos: porProducto,
+            productosEnAlerta: Object.keys(porProducto).filter(
+                (codigo) => porProducto[codigo].some((evento) => evento.alerta_stock)
+            ),
+        };
+    }
+
     async evaluarYEnviarAlerta(prediction, email, isManual = false) {
         if (!prediction.success || !prediction.data) {
             return { success: false, error: "Predicción inválida." };
@@ -0,0 +1,396 @@
+import { spawn } from 'child_process';
+import crypto from 'crypto';
+import path from 'path';
+import fs from 'fs/promises';
+import { PATHS } from '../config/constants.js';
+import { logger } from '../utils/logger.js';
+
+const ACTIVE_STATUSES = ['pending', 'running'];
+const FINISHED_STATUSES = ['completed', 'failed', 'cancelled'];
+
+// Cola de trabajos de predicción con concurrencia limitada, persistida en disco
+class PredictionScheduler {
+    constructor() {
+        this.scriptPath = path.join(PATHS.AI_MODEL_DIR, 'src', 'predict.py');
+        this.jobsDir = PATHS.PREDICTION_JOBS_DIR;
+        this.queueFile = path.join(this.jobsDir, 'queue.json');
+        this.maxWorkers = Math.max(parseInt(process.env.PREDICTION_MAX_WORKERS, 10) || 1, 1);
+        this.maxFinishedJobs = 50;
+        this.timeout = 300000; // 5 minutos
+        // Tiempo máximo que una petición espera un trabajo (cola + ejecución) antes de responder 202
+        this.waitTimeout = parseInt(process.env.PREDICTION_WAIT_TIMEOUT_MS, 10) || 60000;
+
+        this.jobs = new Map();
+        this.waiters = new Map();
+        this.processes = new Map();
+        this.sequence = 0;
+        this.lastPublishedSequence = 0;
+
+        // Callback invocado al terminar un trabajo más reciente que el último publicado
+        this.onJobCompleted = null;
+
+        this.submitting = Promise.resolve();
+        this.publishing = Promise.resolve();
+        this.persisting = Promise.resolve();
+        this.ready = this._restore();
+    }
+
+    // Serializa las escrituras sobre los archivos publicados (resultados de trabajos y ediciones)
+    withPublishLock(task) {
+        const result = this.publishing.then(task);
+        this.publishing = result.catch(() => {});
+        return result;
+    }
+
+    // Hash del libro Excel y de los parámetros que afectan al resultado
+    async _computeJobKey(filePath, params) {
+        const content = await fs.readFile(filePath);
+        return crypto
+            .createHash('sha256')
+            .update(content)
+            .update(JSON.stringify(params))
+            .digest('hex');
+    }
+
+    // Las altas se serializan para que dos cargas idénticas simultáneas se fusionen
+    submit(filePath, options = {}) {
+        const result = this.submitting.then(() => this._submit(filePath, options));
+        this.submitting = result.catch(() => {});
+        return result;
+    }
+
+    async _submit(filePath, { transitDays = 0, priority = 0 } = {}) {
+        await this.ready;
+
+        const params = { transitDays: parseInt(transitDays, 10) || 0 };
+        const key = await this._computeJobKey(filePath, params);
+
+        // Fusionar con un trabajo idéntico que aún no ha terminado
+        const duplicate = [...this.jobs.values()].find(
+            (job) => job.key === key && ACTIVE_STATUSES.includes(job.status)
+        );
+        if (duplicate) {
+            const subscriptionId = crypto.randomUUID();
+            duplicate.subscriptions.push(subscriptionId);
+            duplicate.priority = Math.max(duplicate.priority, priority);
+            logger.info(`Trabajo de predicción ${duplicate.id} reutilizado para carga duplicada`);
+            await this._persist();
+            return { ...this.getStatus(duplicate.id), subscriptionId };
+        }
+
+        const id = crypto.randomUUID();
+        const subscriptionId = crypto.randomUUID();
+        const jobDir = path.join(this.jobsDir, id);
+        await fs.mkdir(jobDir, { recursive: true });
+
+        // Copia propia del libro para que sobreviva a la limpieza del upload y a reinicios
+        const inputPath = path.join(jobDir, `input${path.extname(filePath) || '.xlsx'}`);
+        await fs.copyFile(filePath, inputPath);
+
+        const job = {
+            id,
+            key,
+            sequence: ++this.sequence,
+            status: 'pending',
+            priority,
+            params,
+            inputPath,
+            outputDir: path.join(jobDir, 'output'),
+            // Una suscripción por solicitante; solo quien la recibió puede retirarla
+            subscriptions: [subscriptionId],
+            published: false,
+            error: null,
+            createdAt: new Date().toISOString(),
+            startedAt: null,
+            finishedAt: null,
+        };
+
+        this.jobs.set(id, job);
+        await this._persist();
+        logger.info(`Trabajo de predicción ${id} encolado (prioridad ${priority})`);
+
+        this._drain();
+        return { ...this.getStatus(id), subscriptionId };
+    }
+
+    // Espera el resultado de un trabajo para una suscripción; al vencer el plazo rechaza con
+    // code 'JOB_PENDING' sin cancelarlo, y si la suscripción se cancela, con 'JOB_CANCELLED'
+    waitFor(jobId, subscriptionId = null, timeout = this.waitTimeout) {
+        const job = this.jobs.get(jobId);
+        if (!job) {
+            return Promise.reject(new Error(`Trabajo ${jobId} no encontrado`));
+        }
+        if (FINISHED_STATUSES.includes(job.status)) {
+            return this._settle(job);
+        }
+
+        return new Promise((resolve, reject) => {
+            const waiter = { subscriptionId, resolve, reject, timer: null };
+            if (timeout > 0) {
+                waiter.timer = setTimeout(() => {
+                    this._removeWaiters(jobId, (w) => w === waiter);
+
+                    const error = new Error(`Trabajo ${jobId} aún en proceso`);
+                    error.code = 'JOB_PENDING';
+                    error.jobId = jobId;
+                    error.subscriptionId = subscriptionId;
+                    reject(error);
+                }, timeout);
+            }
+
+            const pending = this.waiters.get(jobId) || [];
+            pending.push(waiter);
+            this.waiters.set(jobId, pending);
+        });
+    }
+
+    // Quita de la espera los waiters que cumplen la condición y los devuelve
+    _removeWaiters(jobId, predicate) {
+        const pending = this.waiters.get(jobId) || [];
+        const removed = pending.filter(predicate);
+        const remaining = pending.filter((w) => !predicate(w));
+        remaining.length ? this.waiters.set(jobId, remaining) : this.waiters.delete(jobId);
+        return removed;
+    }
+
+    // Retira la suscripción de un solicitante; el trabajo solo se detiene cuando no queda ninguna
+    async cancel(jobId, subscriptionId) {
+        await this.ready;
+
+        const job = this.jobs.get(jobId);
+        if (!job) {
+            throw new Error(`Trabajo ${jobId} no encontrado`);
+        }
+        if (!ACTIVE_STATUSES.includes(job.status)) {
+            return this.getStatus(jobId);
+        }
+        if (!job.subscriptions.includes(subscriptionId)) {
+            const error = new Error(`Suscripción no encontrada en el trabajo ${jobId}`);
+            error.code = 'SUBSCRIPTION_NOT_FOUND';
+            throw error;
+        }
+
+        job.subscriptions = job.subscriptions.filter((id) => id !== subscriptionId);
+        this._removeWaiters(jobId, (w) => w.subscriptionId === subscriptionId).forEach(({ reject, timer }) => {
+            clearTimeout(timer);
+            const error = new Error(`Suscripción al trabajo ${jobId} cancelada`);
+            error.code = 'JOB_CANCELLED';
+            reject(error);
+        });
+
+        if (job.subscriptions.length > 0) {
+            await this._persist();
+            logger.info(`Suscripción retirada del trabajo ${jobId} (${job.subscriptions.length} restantes)`);
+            return this.getStatus(jobId);
+        }
+
+        const child = this.processes.get(jobId);
+        if (child) {
+            child.kill();
+        }
+
+        await this._finish(job, 'cancelled', 'Trabajo cancelado');
+        return this.getStatus(jobId);
+    }
+
+    getStatus(jobId) {
+        const job = this.jobs.get(jobId);
+        if (!job) {
+            return null;
+        }
+
+        const { key, inputPath, subscriptions, ...status } = job;
+        status.subscribers = subscriptions.length;
+        if (job.status === 'pending') {
+            status.position = this._pendingJobs().findIndex((j) => j.id === jobId) + 1;
+        }
+        return status;
+    }
+
+    list() {
+        return [...this.jobs.values()]
+            .sort((a, b) => b.sequence - a.sequence)
+            .map((job) => this.getStatus(job.id));
+    }
+
+    // Pendientes ordenados por prioridad (mayor primero) y luego por orden de llegada
+    _pendingJobs() {
+        return [...this.jobs.values()]
+            .filter((job) => job.status === 'pending')
+            .sort((a, b) => b.priority - a.priority || a.sequence - b.sequence);
+    }
+
+    _drain() {
+        while (this.processes.size < this.maxWorkers) {
+            const [next] = this._pendingJobs();
+            if (!next) break;
+            this._run(next);
+        }
+    }
+
+    _run(job) {
+        job.status = 'running';
+        job.startedAt = new Date().toISOString();
+
+        // El delta y los gráficos se generan al publicar, solo para el resultado que queda vigente
+        // Cada trabajo escribe su propio log: RotatingFileHandler no admite varios procesos
+        const args = [
+            '-u', this.scriptPath, '--excel', job.inputPath, '--output_dir', job.outputDir,
+            '--log_file', path.join(this.jobsDir, job.id, 'prediction_log.txt'),
+            '--sin_delta', '--sin_graficos',
+        ];
+        if (job.params.transitDays > 0) {
+            args.push('--dias_transito', job.params.transitDays.toString());
+        }
+
+        const pythonProcess = spawn('python', args);
+        this.processes.set(job.id, pythonProcess);
+        this._persist();
+
+        const timeoutId = setTimeout(() => {
+            pythonProcess.kill();
+            this._finish(job, 'failed', 'Tiempo de ejecución excedido');
+        }, this.timeout);
+
+        pythonProcess.stdout.on('data', (data) => {
+            logger.info(`Python Output [${job.id}]: ${data}`);
+        });
+
+        pythonProcess.stderr.on('data', (data) => {
+            logger.error(`Python Error [${job.id}]: ${data}`);
+        });
+
+        pythonProcess.on('close', async (code) => {
+            clearTimeout(timeoutId);
+            this.processes.delete(job.id);
+
+            if (job.status === 'running') {
+                code === 0
+                    ? await this._finish(job, 'completed')
+                    : await this._finish(job, 'failed', `Script falló con código ${code}`);
+            }
+            this._drain();
+        });
+
+        pythonProcess.on('error', (error) => {
+            clearTimeout(timeoutId);
+            this.processes.delete(job.id);
+            this._finish(job, 'failed', error.message).then(() => this._drain());
+        });
+    }
+
+    async _finish(job, status, error = null) {
+        if (FINISHED_STATUSES.includes(job.status)) return;
+
+        job.status = status;
+        job.error = error;
+        job.finishedAt = new Date().toISOString();
+
+        // Solo se publica si no hay ya un resultado más reciente publicado; la comprobación se
+        // hace dentro del bloqueo para que dos trabajos que terminan a la vez no se pisen
+        if (status === 'completed' && this.onJobCompleted) {
+            await this.withPublishLock(async () => {
+                if (job.sequence <= this.lastPublishedSequence) return;
+                try {
+                    await this.onJobCompleted(job);
+                    job.published = true;
+                    this.lastPublishedSequence = job.sequence;
+                } catch (publishError) {
+                    job.status = 'failed';
+                    job.error = `Error publicando resultados: ${publishError.message}`;
+                }
+            });
+        }
+
+        await fs.rm(job.inputPath, { force: true }).catch(() => {});
+        await this._prune();
+        await this._persist();
+
+        logger.info(`Trabajo de predicción ${job.id} finalizado: ${job.status}`);
+
+        const pending = this.waiters.get(job.id) || [];
+        this.waiters.delete(job.id);
+        pending.forEach(({ resolve, reject, timer }) => {
+            clearTimeout(timer);
+            this._settle(job).then(resolve, reject);
+        });
+    }
+
+    _settle(job) {
+        return job.status === 'completed'
+            ? Promise.resolve(this.getStatus(job.id))
+            : Promise.reject(new Error(job.error || `Trabajo ${job.id} ${job.status}`));
+    }
+
+    // Conserva solo los últimos trabajos terminados y elimina sus directorios
+    async _prune() {
+        const finished = [...this.jobs.values()]
+            .filter((job) => FINISHED_STATUSES.includes(job.status))
+            .sort((a, b) => b.sequence - a.sequence);
+
+        for (const job of finished.slice(this.maxFinishedJobs)) {
+            this.jobs.delete(job.id);
+            await fs.rm(path.join(this.jobsDir, job.id), { recursive: true, force: true }).catch(() => {});
+        }
+    }
+
+    // Las escrituras de la cola se encadenan para que no compitan por el mismo archivo temporal
+    _persist() {
+        this.persisting = this.persisting.then(() => this._writeQueue());
+        return this.persisting;
+    }
+
+    async _writeQueue() {
+        const state = {
+            sequence: this.sequence,
+            lastPublishedSequence: this.lastPublishedSequence,
+            jobs: [...this.jobs.values()],
+        };
+        const tmpFile = `${this.queueFile}.${process.pid}.tmp`;
+        try {
+            await fs.mkdir(this.jobsDir, { recursive: true });
+            await fs.writeFile(tmpFile, JSON.stringify(state, null, 2), 'utf-8');
+            await fs.rename(tmpFile, this.queueFile);
+        } catch (error) {
+            logger.error(`Error guardando cola de predicciones: ${error.message}`);
+        }
+    }
+
+    // Recupera la cola tras un reinicio; los trabajos interrumpidos vuelven a quedar pendientes
+    async _restore() {
+        try {
+            await fs.mkdir(this.jobsDir, { recursive: true });
+            const data = await fs.readFile(this.queueFile, 'utf-8');
+            const state = JSON.parse(data);
+
+            this.sequence = state.sequence || 0;
+            this.lastPublishedSequence = state.lastPublishedSequence || 0;
+            (state.jobs || []).forEach((job) => {
+                // Colas guardadas antes de las suscripciones: nadie puede retirar las anteriores
+                if (!job.subscriptions) {
+                    job.subscriptions = [];
+                    delete job.subscribers;
+                }
+                if (job.status === 'running') {
+                    job.status = 'pending';
+                    job.startedAt = null;
+                }
+                this.jobs.set(job.id, job);
+            });
+
+            const pending = this._pendingJobs().length;
+            if (pending > 0) {
+                logger.info(`Cola de predicciones restaurada con ${pending} trabajos pendientes`);
+            }
+        } catch (error) {
+            if (error.code !== 'ENOENT') {
+                logger.error(`Error restaurando cola de predicciones: ${error.message}`);
+            }
+        }
+
+        // Se difiere para que el callback de publicación quede registrado antes de ejecutar
+        setImmediate(() => this._drain());
+    }
+}
+
+export default new PredictionScheduler();
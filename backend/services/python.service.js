@@ -3,13 +3,20 @@ import path from 'path';
 import fs from 'fs/promises';
 import { PATHS } from '../config/constants.js';
 import { logger } from '../utils/logger.js';
+import { accumulateProductInCube, replaceProductEvents } from '../utils/predictionIndexes.js';
+import predictionScheduler from './predictionScheduler.service.js';
 
 class PythonService {
     constructor() {
         this.scriptPath = path.join(process.cwd(), 'ai_model', 'src', 'predict.py');
         this.dataDir = path.join(process.cwd(), 'ai_model', 'data');
         this.predictionsFile = path.join(this.dataDir, 'predicciones_completas.min.json');
-        this.timeout = 300000; // 5 minutos
+        this.eventsIndexFile = path.join(this.dataDir, 'indice_eventos.json');
+        this.aggregationCubeFile = path.join(this.dataDir, 'cubo_agregado.json');
+        this.deltaFile = path.join(this.dataDir, 'predicciones_delta.json');
+        this.deltaScriptPath = path.join(process.cwd(), 'ai_model', 'src', 'delta.py');
+        this.chartsScriptPath = path.join(process.cwd(), 'ai_model', 'src', 'graficos.py');
+        this.chartsIndexFile = path.join(PATHS.CHARTS_DIR, 'indice_graficos.json');
         // Constants from the Python function
         this.leadTimeDays = 20;
         this.alarmaStockDays = 22;
@@ -22,6 +29,9 @@ class PythonService {
         fs.mkdir(this.dataDir, { recursive: true }).catch(err => {
             logger.error(`Error creating data directory: ${err}`);
         });
+
+        // Solo el trabajo terminado más reciente reemplaza los archivos compartidos
+        predictionScheduler.onJobCompleted = (job) => this._publishJobOutput(job);
     }
 
     // Utility to validate Date objects
@@ -91,76 +101,146 @@ class PythonService {
         return count;
     }
 
-    async processExcel(file, transitDays = 0) {
+    async processExcel(file, transitDays = 0, options = {}) {
         try {
-            await this.runScript(file.path, transitDays);
-            await this.validateOutput();
-            const predictions = await this.getLatestPredictions();
-            predictions.forEach(product => {
-                product.CONFIGURACION.DIAS_TRANSITO = transitDays;
-            });
-            await this._savePredictions(predictions);
-            return predictions;
+            const { priority = 0 } = options;
+            const job = await predictionScheduler.submit(file.path, { transitDays, priority });
+            const finishedJob = await predictionScheduler.waitFor(job.id, job.subscriptionId);
+            return await this._readJobPredictions(finishedJob);
         } catch (error) {
-            logger.error(`Python Service Error: ${error.message}`);
+            if (!['JOB_PENDING', 'JOB_CANCELLED'].includes(error.code)) {
+                logger.error(`Python Service Error: ${error.message}`);
+            }
             throw error;
         } finally {
             await this.cleanTempFiles(file.path);
         }
     }
 
-    runScript(inputPath, transitDays) {
-        return new Promise((resolve, reject) => {
-            const args = [
-                '-u',
-                this.scriptPath,
-                '--excel',
-                inputPath,
-            ];
-
-            if (transitDays > 0) {
-                args.push('--dias_transito', transitDays.toString());
+    async validateOutput(filePath = this.predictionsFile) {
+        try {
+            await fs.access(filePath, fs.constants.F_OK);
+            const stats = await fs.stat(filePath);
+            if (stats.size === 0) {
+                throw new Error('Archivo de predicciones vacío');
             }
+        } catch (error) {
+            throw new Error(`Error validando output: ${error.message}`);
+        }
+    }
+
+    async _readJobPredictions(job) {
+        const outputFile = path.join(job.outputDir, 'predicciones_completas.min.json');
+        await this.validateOutput(outputFile);
 
-            const pythonProcess = spawn('python', args);
+        const predictions = JSON.parse(await fs.readFile(outputFile, 'utf-8'));
+        predictions.forEach(product => {
+            product.CONFIGURACION.DIAS_TRANSITO = job.params.transitDays;
+        });
+        return predictions;
+    }
 
-            const timeoutId = setTimeout(() => {
-                pythonProcess.kill();
-                reject(new Error('Tiempo de ejecución excedido'));
-            }, this.timeout);
+    // Publica la salida de un trabajo terminado en los archivos compartidos del directorio data
+    async _publishJobOutput(job) {
+        const predictions = await this._readJobPredictions(job);
+
+        // El delta se calcula contra lo publicado ahora (con varios workers otro trabajo pudo
+        // publicar después de que este empezara), con la misma implementación que predict.py
+        await this._runPythonScript(this.deltaScriptPath, [
+            '--anterior', this.predictionsFile,
+            '--actual', path.join(job.outputDir, 'predicciones_completas.min.json'),
+            '--salida', path.join(job.outputDir, 'predicciones_delta.json'),
+        ]);
+
+        await this._savePredictions(predictions);
+
+        for (const fileName of ['indice_eventos.json', 'cubo_agregado.json', 'predicciones_delta.json']) {
+            const source = path.join(job.outputDir, fileName);
+            const tmpTarget = path.join(this.dataDir, `${fileName}.${job.id}.tmp`);
+            await fs.copyFile(source, tmpTarget);
+            await fs.rename(tmpTarget, path.join(this.dataDir, fileName));
+        }
+        logger.info(`Resultados del trabajo ${job.id} publicados`);
 
-            let output = '';
+        this._renderCharts();
+    }
 
-            pythonProcess.stdout.on('data', (data) => {
-                output += data.toString();
-                logger.info(`Python Output: ${data}`);
-            });
+    // Ejecuta un script de Python auxiliar y espera a que termine
+    _runPythonScript(scriptPath, args) {
+        return new Promise((resolve, reject) => {
+            const pythonProcess = spawn('python', [scriptPath, ...args]);
+            let stderr = '';
 
             pythonProcess.stderr.on('data', (data) => {
-                logger.error(`Python Error: ${data}`);
+                stderr += data;
             });
-
+            pythonProcess.on('error', reject);
             pythonProcess.on('close', (code) => {
-                clearTimeout(timeoutId);
                 code === 0
-                    ? resolve(output)
-                    : reject(new Error(`Script falló con código ${code}`));
+                    ? resolve()
+                    : reject(new Error(stderr.trim() || `${path.basename(scriptPath)} falló con código ${code}`));
             });
         });
     }
 
-    async validateOutput() {
+    // Genera los gráficos en un proceso aparte; la publicación no espera a que termine
+    _renderCharts() {
+        const chartsProcess = spawn('python', [
+            this.chartsScriptPath,
+            '--predicciones', this.predictionsFile,
+            '--dir_graficos', PATHS.CHARTS_DIR
+        ], { stdio: 'ignore', detached: true });
+
+        chartsProcess.on('error', (error) => {
+            logger.warn(`No se pudo lanzar la generación de gráficos: ${error.message}`);
+        });
+        chartsProcess.unref();
+    }
+
+    async _getChartEntry(code) {
         try {
-            await fs.access(this.predictionsFile, fs.constants.F_OK);
-            const stats = await fs.stat(this.predictionsFile);
-            if (stats.size === 0) {
-                throw new Error('Archivo de predicciones vacío');
-            }
+            const data = await fs.readFile(this.chartsIndexFile, 'utf-8');
+            return JSON.parse(data)[code] || null;
         } catch (error) {
-            throw new Error(`Error validando output: ${error.message}`);
+            if (error.code === 'ENOENT') {
+                return null;
+            }
+            throw new Error(`Error leyendo índice de gráficos: ${error.message}`);
         }
     }
 
+    // URL estable del producto (para reportes) y URL de la versión actual (cacheable)
+    async getChartUrls(code) {
+        const chart = await this._getChartEntry(code);
+        return chart ? {
+            url: `/api/charts/productos/${encodeURIComponent(code)}`,
+            versionUrl: `/api/charts/${encodeURIComponent(chart.archivo)}`,
+        } : null;
+    }
+
+    async getChartFile(code) {
+        const chart = await this._getChartEntry(code);
+        return chart ? path.join(PATHS.CHARTS_DIR, chart.archivo) : null;
+    }
+
+    getJobStatus(jobId) {
+        return predictionScheduler.getStatus(jobId);
+    }
+
+    listJobs() {
+        return predictionScheduler.list();
+    }
+
+    cancelJob(jobId, subscriptionId) {
+        return predictionScheduler.cancel(jobId, subscriptionId);
+    }
+
+    async _writeJsonAtomic(filePath, data, space = undefined) {
+        const tmpFile = `${filePath}.${process.pid}.${Date.now()}.tmp`;
+        await fs.writeFile(tmpFile, JSON.stringify(data, null, space), 'utf-8');
+        await fs.rename(tmpFile, filePath);
+    }
+
     async getLatestPredictions() {
         try {
             const data = await fs.readFile(this.predictionsFile, 'utf-8');
@@ -170,6 +250,57 @@ class PythonService {
         }
     }
 
+    // Consulta por rango sobre el índice de eventos generado por predict.py (ordenado por fecha)
+    async getUpcomingEvents(days = 7, fromDate = new Date(), type = null) {
+        try {
+            const data = await fs.readFile(this.eventsIndexFile, 'utf-8');
+            const index = JSON.parse(data);
+
+            const start = new Date(fromDate);
+            const end = new Date(start);
+            end.setDate(end.getDate() + days);
+            const desde = this._toLocalDateString(start);
+            const hasta = this._toLocalDateString(end);
+
+            const lowerBound = (target, inclusive) => {
+                let lo = 0;
+                let hi = index.FECHAS.length;
+                while (lo < hi) {
+                    const mid = (lo + hi) >> 1;
+                    const fecha = index.FECHAS[mid];
+                    if (fecha < target || (inclusive && fecha === target)) {
+                        lo = mid + 1;
+                    } else {
+                        hi = mid;
+                    }
+                }
+                return lo;
+            };
+
+            const events = index.EVENTOS.slice(lowerBound(desde, false), lowerBound(hasta, true));
+            return type ? events.filter((e) => e.tipo === type) : events;
+        } catch (error) {
+            throw new Error(`Error leyendo índice de eventos: ${error.message}`);
+        }
+    }
+
+    // Fecha YYYY-MM-DD en hora local (toISOString usa UTC y adelanta un día por la noche)
+    _toLocalDateString(date) {
+        const month = String(date.getMonth() + 1).padStart(2, '0');
+        const day = String(date.getDate()).padStart(2, '0');
+        return `${date.getFullYear()}-${month}-${day}`;
+    }
+
+    // Reemplaza las entradas de un producto en el índice de eventos tras una edición
+    async _updateEventsIndex(product) {
+        try {
+            const index = JSON.parse(await fs.readFile(this.eventsIndexFile, 'utf-8'));
+            await this._writeJsonAtomic(this.eventsIndexFile, replaceProductEvents(index, product));
+        } catch (error) {
+            logger.warn(`No se pudo actualizar el índice de eventos: ${error.message}`);
+        }
+    }
+
     async cleanTempFiles(filePath) {
         try {
             await fs.unlink(filePath);
@@ -229,9 +360,7 @@ class PythonService {
             this._updateProductMetrics(product);
 
             if (persistChanges) {
-                const updatedPredictions = [...predictions];
-                updatedPredictions[productIndex] = product;
-                await this._savePredictions(updatedPredictions);
+                await this._persistProductUpdate(product);
             }
 
             return product;
@@ -428,9 +557,7 @@ class PythonService {
             }
 
             if (persistChanges) {
-                const updatedPredictions = [...predictions];
-                updatedPredictions[productIndex] = productToUpdate;
-                await this._savePredictions(updatedPredictions);
+                await this._persistProductUpdate(productToUpdate);
             }
 
             return productToUpdate;
@@ -465,9 +592,7 @@ class PythonService {
             }
 
             if (persistChanges) {
-                const updatedPredictions = [...predictions];
-                updatedPredictions[productIndex] = productToUpdate;
-                await this._savePredictions(updatedPredictions);
+                await this._persistProductUpdate(productToUpdate);
             }
 
             return productToUpdate;
@@ -664,11 +789,8 @@ class PythonService {
 
     async _savePredictions(predictions) {
         try {
-            await fs.writeFile(
-                this.predictionsFile,
-                JSON.stringify(predictions, null, 2),
-                'utf-8'
-            );
+            // Escritura atómica para no dejar el archivo a medias si hay escrituras concurrentes
+            await this._writeJsonAtomic(this.predictionsFile, predictions, 2);
             logger.info('Predicciones actualizadas correctamente');
         } catch (error) {
             logger.error(`Error guardando predicciones: ${error.message}`);
@@ -676,6 +798,57 @@ class PythonService {
         }
     }
 
+    // Cambios de la última ejecución respecto a la anterior (agregados, eliminados y campos modificados)
+    async getLatestDelta() {
+        try {
+            const data = await fs.readFile(this.deltaFile, 'utf-8');
+            return JSON.parse(data);
+        } catch (error) {
+            throw new Error(`Error leyendo delta de predicciones: ${error.message}`);
+        }
+    }
+
+    async getAggregationCube() {
+        try {
+            const data = await fs.readFile(this.aggregationCubeFile, 'utf-8');
+            return JSON.parse(data);
+        } catch (error) {
+            throw new Error(`Error leyendo cubo agregado: ${error.message}`);
+        }
+    }
+
+    // Actualización incremental del cubo al modificar un único producto
+    async _updateAggregationCube(previousProduct, updatedProduct) {
+        try {
+            const cube = await this.getAggregationCube();
+            if (previousProduct) accumulateProductInCube(cube, previousProduct, -1);
+            if (updatedProduct) accumulateProductInCube(cube, updatedProduct, 1);
+            await this._writeJsonAtomic(this.aggregationCubeFile, cube);
+        } catch (error) {
+            logger.warn(`No se pudo actualizar el cubo agregado: ${error.message}`);
+        }
+    }
+
+    // Guarda un producto editado dentro del bloqueo de publicación. Se relee el archivo para no
+    // sobrescribir un resultado publicado mientras se calculaba la edición
+    _persistProductUpdate(updatedProduct) {
+        return predictionScheduler.withPublishLock(async () => {
+            const predictions = await this.getLatestPredictions();
+            const productIndex = predictions.findIndex((p) => p.CODIGO === updatedProduct.CODIGO);
+            if (productIndex === -1) {
+                throw new Error(`Producto ${updatedProduct.CODIGO} no encontrado`);
+            }
+
+            const previousProduct = predictions[productIndex];
+            predictions[productIndex] = updatedProduct;
+            await this._savePredictions(predictions);
+            await this._updateAggregationCube(previousProduct, updatedProduct);
+            await this._updateEventsIndex(updatedProduct);
+            // Las proyecciones cambiaron; solo se vuelve a renderizar el gráfico de este producto
+            this._renderCharts();
+        });
+    }
+
     async getProductByCode(productCode) {
         try {
             const predictions = await this.getLatestPredictions();
@@ -711,9 +884,7 @@ class PythonService {
             this._recalculateProductValues(updatedProduct);
             this._recalculateProjections(updatedProduct, updatedProduct.CONFIGURACION.DIAS_TRANSITO || 0);
 
-            const updatedPredictions = [...predictions];
-            updatedPredictions[productIndex] = updatedProduct;
-            await this._savePredictions(updatedPredictions);
+            await this._persistProductUpdate(updatedProduct);
 
             return updatedProduct;
         } catch (error) {
@@ -0,0 +1,136 @@
+// Actualización incremental de los archivos derivados de las predicciones (cubo agregado e
+// índice de eventos). Replican construir_cubo_agregado y construir_indice_eventos de
+// predict.py; ai_model/tests/test_indices.py comprueba que actualizar un producto da el mismo
+// resultado que reconstruir desde cero.
+
+// Redondeo a 2 decimales igual que round(x, 2) de Python: sobre el valor binario exacto y, en
+// los empates exactos (solo posibles cuando x * 8 es un entero impar), al número par
+export const roundLikePython = (value) => {
+    const eighths = value * 8;
+    if (Number.isInteger(eighths) && Math.abs(eighths) % 2 === 1) {
+        const floor = Math.floor(value * 100);
+        return (floor % 2 === 0 ? floor : floor + 1) / 100;
+    }
+    return Number(value.toFixed(2));
+};
+
+// Misma clave de agrupación que clave_grupo_cubo en predict.py
+export const getCubeGroupKey = (codigo, agrupacion) => {
+    const code = String(codigo).trim();
+    if (agrupacion === 'familia') {
+        return code.split('-')[0] || 'SIN_FAMILIA';
+    }
+    if (agrupacion === 'prefijo') {
+        const match = code.match(/^[A-Za-z]+/);
+        return match ? match[0].toUpperCase() : code.slice(0, 2) || 'SIN_PREFIJO';
+    }
+    return null;
+};
+
+// Suma (sign = 1) o resta (sign = -1) los aportes de un producto al cubo. Como en Python, cada
+// aporte se redondea a 2 decimales antes de sumarlo, así el resultado no depende del orden
+export const accumulateProductInCube = (cube, product, sign = 1) => {
+    const group = getCubeGroupKey(product.CODIGO, cube.AGRUPACION);
+    const targets = [cube.TOTAL];
+    if (group !== null) {
+        cube.GRUPOS[group] = cube.GRUPOS[group] || {};
+        targets.push(cube.GRUPOS[group]);
+    }
+
+    (product.PROYECCIONES || []).forEach((projection) => {
+        const contributions = {
+            productos: 1,
+            consumo_mensual: projection.consumo_mensual,
+            cajas_a_pedir: projection.cajas_a_pedir,
+            unidades_a_pedir: projection.unidades_a_pedir,
+            productos_en_alerta: projection.alerta_stock ? 1 : 0,
+            stock_proyectado: projection.stock_proyectado,
+        };
+        targets.forEach((target) => {
+            if (!target[projection.mes]) {
+                target[projection.mes] = Object.fromEntries(cube.METRICAS.map((m) => [m, 0]));
+            }
+            const cell = target[projection.mes];
+            Object.entries(contributions).forEach(([metric, value]) => {
+                // Sumas de valores con 2 decimales: aquí no hay empates y basta Math.round
+                cell[metric] = Math.round((cell[metric] + sign * roundLikePython(value || 0)) * 100) / 100;
+            });
+        });
+    });
+
+    // Eliminar meses y grupos que quedaron vacíos tras restar un producto (una reconstrucción
+    // solo tiene los meses que aparecen en alguna proyección)
+    if (sign < 0) {
+        targets.forEach((target) => {
+            Object.keys(target)
+                .filter((mes) => target[mes].productos <= 0)
+                .forEach((mes) => delete target[mes]);
+        });
+        if (group !== null && Object.keys(cube.GRUPOS[group]).length === 0) {
+            delete cube.GRUPOS[group];
+        }
+    }
+};
+
+// Eventos de un producto, con los mismos criterios que construir_indice_eventos en predict.py
+export const buildProductEvents = (product) => {
+    const eventTypes = {
+        SOLICITUD: 'fecha_solicitud',
+        REPOSICION: 'fecha_reposicion',
+        ARRIBO: 'fecha_arribo',
+    };
+    const events = [];
+    const alertMonths = [];
+
+    (product.PROYECCIONES || []).forEach((projection) => {
+        if (projection.cajas_a_pedir <= 0 && !projection.alerta_stock) return;
+
+        Object.entries(eventTypes).forEach(([tipo, field]) => {
+            const fecha = projection[field] === undefined ? 'No aplica' : projection[field];
+            if (fecha === 'No aplica') return;
+            events.push({
+                fecha,
+                tipo,
+                CODIGO: product.CODIGO,
+                mes: projection.mes,
+                cajas_a_pedir: projection.cajas_a_pedir,
+                unidades_a_pedir: projection.unidades_a_pedir,
+                alerta_stock: projection.alerta_stock,
+            });
+        });
+
+        if (projection.alerta_stock) {
+            alertMonths.push(projection.mes);
+        }
+    });
+
+    return { events, alertMonths };
+};
+
+// Índice de eventos con las entradas de un producto sustituidas por las de su versión editada
+export const replaceProductEvents = (index, product) => {
+    const { events, alertMonths } = buildProductEvents(product);
+
+    // Mismo orden que la reconstrucción: (fecha, CODIGO, tipo), estable dentro de un producto
+    const compareKey = (a, b) => (a < b ? -1 : a > b ? 1 : 0);
+    const allEvents = index.EVENTOS
+        .filter((event) => event.CODIGO !== product.CODIGO)
+        .concat(events)
+        .sort((a, b) => compareKey(a.fecha, b.fecha)
+            || compareKey(a.CODIGO, b.CODIGO)
+            || compareKey(a.tipo, b.tipo));
+
+    const alerts = { ...index.ALERTAS };
+    delete alerts[product.CODIGO];
+    if (alertMonths.length > 0) {
+        alerts[product.CODIGO] = alertMonths;
+    }
+
+    return {
+        ...index,
+        TOTAL_EVENTOS: allEvents.length,
+        FECHAS: allEvents.map((event) => event.fecha),
+        EVENTOS: allEvents,
+        ALERTAS: Object.fromEntries(Object.entries(alerts).sort(([a], [b]) => compareKey(a, b))),
+    };
+};